@@ -0,0 +1,313 @@
+"""Асинхронные варианты эндпоинтов чтения для запуска под ASGI.
+
+В Django 3.2 нет асинхронного ORM, поэтому запросы к БД выполняются в
+пуле потоков (sync_to_async с thread_sensitive=False), а цикл событий
+тем временем обслуживает другие соединения. Флаги избранного, корзины и
+подписок берутся из множеств пользователя в кэше (api.membership).
+
+Фильтры, пагинация и сериализаторы те же, что у синхронных view.
+"""
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from api.authentication import CachedTokenAuthentication
+from api.cache import (RECIPES_GENERATION, TAGS_GENERATION, content_etag,
+                       is_shared_cache, make_etag, not_modified,
+                       recipe_generation, set_etag, user_generation)
+from api.instrumentation import profile_queries
+from api.membership import get_membership
+from api.renderers import ORJSONRenderer
+from api.serializers import (IngredientsSerializer, RecipeReadSerializer,
+                             SubscriptionSerializer, TagSerializer,
+                             get_recipes_limit)
+from api.views import (IngredientsViewSet, RecipesViewSet, SubscriptionView,
+                       TagsViewSet)
+from recipes.models import Recipe
+
+renderer = ORJSONRenderer()
+
+
+def in_thread(func):
+    """Выполняет func в пуле потоков, не блокируя цикл событий."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Соединения потоков пула живут по правилам CONN_MAX_AGE, как
+        # соединение обычного запроса: с пулом БД оно возвращается в пул
+        # сразу, а не остается за простаивающим потоком.
+        close_old_connections()
+        try:
+            with profile_queries():
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        renderer.render(data),
+        content_type=renderer.media_type,
+        status=status_code,
+    )
+
+
+def api_view(view):
+    """Аутентификация по токену и ошибки в формате DRF."""
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return json_response(
+                {'detail': f'Метод "{request.method}" не разрешен.'},
+                status.HTTP_405_METHOD_NOT_ALLOWED,
+            )
+        try:
+            request = await authenticate(request)
+            return await view(request, *args, **kwargs)
+        except Http404:
+            return json_response(
+                {'detail': 'Страница не найдена.'}, status.HTTP_404_NOT_FOUND
+            )
+        except APIException as exc:
+            response = json_response(
+                exc.detail if isinstance(exc.detail, (list, dict))
+                else {'detail': exc.detail},
+                exc.status_code,
+            )
+            if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+                response['WWW-Authenticate'] = (
+                    CachedTokenAuthentication.keyword
+                )
+            return response
+
+    return wrapper
+
+
+@in_thread
+def authenticate(request):
+    request = Request(request, authenticators=[CachedTokenAuthentication()])
+    # Токен проверяется при первом обращении к user.
+    request.user
+    return request
+
+
+def make_view(view_class, request, action=None, **kwargs):
+    """Экземпляр синхронного view ради его фильтров и пагинации."""
+    return view_class(
+        request=request, args=(), kwargs=kwargs,
+        format_kwarg=None, action=action,
+    )
+
+
+@in_thread
+def conditional(request, generation_names, user=None, max_age=None):
+    """Пара (etag, 304 или None) — как у ConditionalGetMixin.
+
+    Без общего кэша etag — None, его считает with_etag по ответу.
+    """
+    if not is_shared_cache():
+        return None, None
+    etag = make_etag(
+        request, generation_names, renderer.media_type, user=user,
+        max_age=max_age,
+    )
+    return etag, not_modified(request, etag)
+
+
+def with_etag(request, response, etag, private=False):
+    """Ставит ETag ответу; без etag — по содержимому, и совпавший
+    If-None-Match получает 304."""
+    if etag is None:
+        etag = content_etag(response.content, renderer.media_type)
+        response = not_modified(request, etag) or response
+    set_etag(response, etag, private=private)
+    return response
+
+
+def user_generations(user):
+    if user.is_authenticated:
+        return [user_generation(user.pk)]
+    return []
+
+
+@in_thread
+def missing_user_sets(request):
+    return get_membership(request).missing()
+
+
+@in_thread
+def load_user_set(request, kind):
+    return get_membership(request).get(kind)
+
+
+async def get_user_sets(request):
+    """Множества пользователя; промахи кэша загружаются параллельно."""
+    missing = await missing_user_sets(request)
+    await asyncio.gather(*(load_user_set(request, kind) for kind in missing))
+    membership = get_membership(request)
+    return membership.favorites, membership.cart, membership.subscriptions
+
+
+async def set_user_flags(request, recipes):
+    """Флаги пользователя для рецептов страницы из множеств в кэше."""
+    if request.user.is_authenticated:
+        favorited, in_cart, subscribed = await get_user_sets(request)
+    else:
+        favorited = in_cart = subscribed = set()
+    for recipe in recipes:
+        recipe.is_favorited = recipe.pk in favorited
+        recipe.is_in_shopping_cart = recipe.pk in in_cart
+        recipe.author_is_subscribed = recipe.author_id in subscribed
+
+
+@in_thread
+def recipes_page(request):
+    view = make_view(RecipesViewSet, request, 'list')
+    queryset = view.filter_queryset(Recipe.objects.with_related())
+    return view, view.paginate_queryset(queryset)
+
+
+@in_thread
+def serialize_recipes_page(view, page):
+    serializer = RecipeReadSerializer(
+        page, many=True, context={'request': view.request}
+    )
+    return view.get_paginated_response(serializer.data).data
+
+
+@in_thread
+def anonymous_recipes(request):
+    """Анонимам — синхронный список с его кэшем ответов и ETag."""
+    request.accepted_renderer = renderer
+    request.accepted_media_type = renderer.media_type
+    response = make_view(RecipesViewSet, request, 'list').list(request)
+    if isinstance(response, Response):
+        rendered = json_response(response.data, response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        response = rendered
+    return response
+
+
+@api_view
+async def recipes_list(request):
+    if request.user.is_anonymous:
+        response = await anonymous_recipes(request)
+    else:
+        etag, response = await conditional(
+            request,
+            [RECIPES_GENERATION, *user_generations(request.user)],
+            user=request.user, max_age=settings.RESPONSE_CACHE['TIMEOUT'],
+        )
+        if response is None:
+            view, page = await recipes_page(request)
+            await set_user_flags(request, page)
+            response = with_etag(request, json_response(
+                await serialize_recipes_page(view, page)
+            ), etag, private=True)
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+@in_thread
+def get_recipe(pk):
+    return get_object_or_404(Recipe.objects.with_related(), pk=pk)
+
+
+@in_thread
+def serialize_recipe(request, recipe):
+    return RecipeReadSerializer(recipe, context={'request': request}).data
+
+
+@api_view
+async def recipe_detail(request, pk):
+    etag, response = await conditional(
+        request,
+        [
+            RECIPES_GENERATION, recipe_generation(pk),
+            *user_generations(request.user),
+        ],
+        user=request.user,
+    )
+    if response is None:
+        recipe = await get_recipe(pk)
+        await set_user_flags(request, [recipe])
+        response = with_etag(
+            request,
+            json_response(await serialize_recipe(request, recipe)),
+            etag, private=request.user.is_authenticated,
+        )
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+@in_thread
+def serialize_tags(request):
+    view = make_view(TagsViewSet, request, 'list')
+    return TagSerializer(view.get_queryset(), many=True).data
+
+
+@api_view
+async def tags_list(request):
+    etag, response = await conditional(request, [TAGS_GENERATION])
+    if response is None:
+        response = with_etag(
+            request, json_response(await serialize_tags(request)), etag
+        )
+    return response
+
+
+@in_thread
+def serialize_ingredients(request):
+    view = make_view(IngredientsViewSet, request, 'list')
+    query = request.query_params.get(api_settings.SEARCH_PARAM)
+    if query and settings.INGREDIENT_AUTOCOMPLETE['INDEX_ENABLED']:
+        return view.search_index(request, query).data
+    return IngredientsSerializer(
+        view.filter_queryset(view.get_queryset()), many=True
+    ).data
+
+
+@api_view
+async def ingredients_list(request):
+    etag, response = await conditional(
+        request, IngredientsViewSet.etag_generations
+    )
+    if response is None:
+        response = with_etag(
+            request, json_response(await serialize_ingredients(request)),
+            etag,
+        )
+    return response
+
+
+@in_thread
+def subscriptions_page(request):
+    view = make_view(SubscriptionView, request)
+    page = view.paginate_queryset(view.get_queryset())
+    serializer = SubscriptionSerializer(page, many=True, context={
+        'request': request,
+        'recipes_limit': get_recipes_limit(request),
+    })
+    return view.get_paginated_response(serializer.data).data
+
+
+@api_view
+async def subscriptions_list(request):
+    if not request.user.is_authenticated:
+        raise NotAuthenticated()
+    return json_response(await subscriptions_page(request))
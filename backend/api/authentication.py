@@ -0,0 +1,204 @@
+"""Аутентификация по токену с кэшем пользователей.
+
+Ключ токена отображается в снимок пользователя. Снимок хранится в памяти
+процесса (LRU с коротким сроком жизни) и, если включено, в общем кэше,
+так что на попадание запрос к БД не нужен. Запись сбрасывается после
+коммита при выходе, удалении токена и любом сохранении пользователя:
+смене пароля, деактивации. Другие процессы видят изменение не позже чем
+через LOCAL_TIMEOUT.
+
+Сброс увеличивает поколение токена. Запрос, который прочитал
+снимок из БД до коммита, а записал его в кэш после сброса, замечает
+новое поколение и удаляет свою запись.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from api.cache import bump_generation, get_cache, get_generation
+from foodgram.timing import record_timing
+from users.models import User
+
+# Хэш пароля в кэш не попадает, при обращении он дочитывается из БД.
+# Счетчики тоже остаются отложенными: полное сохранение request.user
+# обновляет только загруженные поля и не вернет их старые значения.
+SKIPPED_USER_FIELDS = {'password', 'recipes_count', 'followers_count'}
+USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname not in SKIPPED_USER_FIELDS
+)
+TOKEN_FIELDS = ('key', 'user_id', 'created')
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш в памяти процесса со сроком жизни."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_tokens = LRUCache(settings.TOKEN_AUTH['LOCAL_MAX_SIZE'])
+
+
+def _digest(key):
+    # Ключ токена в общий кэш не пишется в открытом виде.
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _shared_key(key):
+    return f'token:{_digest(key)}'
+
+
+def token_generation(key):
+    return f'token-auth:{_digest(key)}'
+
+
+def get_entry(key):
+    """Снимок (значения USER_FIELDS, время создания токена) или None."""
+    config = settings.TOKEN_AUTH
+    entry = local_tokens.get(key)
+    if entry is None and config['SHARED_CACHE']:
+        entry = get_cache().get(_shared_key(key))
+        if entry is not None:
+            local_tokens.set(key, entry, config['LOCAL_TIMEOUT'])
+    return entry
+
+
+def set_entry(key, entry):
+    config = settings.TOKEN_AUTH
+    local_tokens.set(key, entry, config['LOCAL_TIMEOUT'])
+    if config['SHARED_CACHE']:
+        get_cache().set(_shared_key(key), entry, config['SHARED_TIMEOUT'])
+
+
+def delete_entries(keys):
+    for key in keys:
+        local_tokens.delete(key)
+    if keys and settings.TOKEN_AUTH['SHARED_CACHE']:
+        get_cache().delete_many([_shared_key(key) for key in keys])
+
+
+def invalidate(keys):
+    """Сбрасывает снимки токенов keys и увеличивает их поколения."""
+    for key in keys:
+        bump_generation(token_generation(key))
+    delete_entries(keys)
+
+
+def expired_before():
+    """Токены, созданные раньше этого времени, истекли; None — бессрочно."""
+    expires_after = settings.TOKEN_AUTH['EXPIRES_AFTER']
+    if not expires_after:
+        return None
+    return timezone.now() - timedelta(seconds=expires_after)
+
+
+def is_expired(created):
+    threshold = expired_before()
+    return threshold is not None and created < threshold
+
+
+def delete_expired_token(user):
+    """Удаляет истекший токен user, чтобы вход выдал новый."""
+    threshold = expired_before()
+    if threshold is not None:
+        Token.objects.filter(user=user, created__lt=threshold).delete()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, которая берет пользователя из кэша.
+
+    Если задан EXPIRES_AFTER, токен старше этого числа секунд удаляется
+    и запрос отклоняется; новый токен выдает auth/token/login/.
+    """
+
+    model = Token
+
+    def authenticate_credentials(self, key):
+        started = time.perf_counter()
+        enabled = settings.TOKEN_AUTH['CACHE_ENABLED']
+        entry = get_entry(key) if enabled else None
+        hit = entry is not None
+        if entry is None:
+            entry = self.load_and_store(key) if enabled else self.load(key)
+        values, created = entry
+        if is_expired(created):
+            Token.objects.filter(key=key).delete()
+            raise exceptions.AuthenticationFailed(
+                'Срок действия токена истек.'
+            )
+        user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values)
+        token = Token.from_db(
+            DEFAULT_DB_ALIAS, TOKEN_FIELDS, (key, user.pk, created)
+        )
+        token.user = user
+        record_timing(
+            'auth', time.perf_counter() - started, 'hit' if hit else 'miss'
+        )
+        return user, token
+
+    def load_and_store(self, key):
+        """Читает снимок из БД и кладет его в кэш.
+
+        Поколение проверяется после записи: если между чтением из БД и
+        записью снимок сбросили, запись удаляется.
+        """
+        generation = get_generation(token_generation(key))
+        entry = self.load(key)
+        set_entry(key, entry)
+        if get_generation(token_generation(key)) != generation:
+            delete_entries([key])
+        return entry
+
+    def load(self, key):
+        try:
+            token = Token.objects.select_related('user').get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return (
+            tuple(getattr(token.user, name) for name in USER_FIELDS),
+            token.created,
+        )
@@ -0,0 +1,73 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+
+from api.cache import get_generation
+from recipes.models import Ingredient
+
+INGREDIENTS_GENERATION = 'ingredients'
+
+
+class IngredientIndex:
+    """Отсортированный в памяти процесса каталог ингредиентов.
+
+    Префиксный поиск — бинарный поиск по нижнему регистру названий,
+    после префиксных совпадений идут совпадения по подстроке. Индекс
+    перечитывается, когда меняется поколение ingredients, и не реже раза
+    в INDEX_TTL секунд: с кэшем в памяти процесса поколение, сброшенное
+    в другом процессе, здесь не видно.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._loaded_at = None
+        self._snapshot = ((), ())
+
+    def _is_fresh(self, generation):
+        ttl = settings.INGREDIENT_AUTOCOMPLETE['INDEX_TTL']
+        return generation == self._generation and (
+            time.monotonic() - self._loaded_at < ttl
+        )
+
+    def _refresh(self):
+        generation = get_generation(INGREDIENTS_GENERATION)
+        if self._is_fresh(generation):
+            return self._snapshot
+        with self._lock:
+            if not self._is_fresh(generation):
+                rows = sorted(
+                    (
+                        {'id': pk, 'name': name, 'measurement_unit': unit}
+                        for pk, name, unit in Ingredient.objects.values_list(
+                            'id', 'name', 'measurement_unit'
+                        )
+                    ),
+                    key=lambda row: (row['name'].lower(), row['id']),
+                )
+                keys = tuple(row['name'].lower() for row in rows)
+                self._snapshot = (keys, tuple(rows))
+                self._generation = generation
+                self._loaded_at = time.monotonic()
+        return self._snapshot
+
+    def search(self, query, limit=None):
+        keys, rows = self._refresh()
+        query = query.lower()
+        start = bisect.bisect_left(keys, query)
+        end = bisect.bisect_left(keys, query + chr(0x10FFFF), lo=start)
+        result = list(rows[start:end][:limit])
+        if limit is not None and len(result) >= limit:
+            return result
+        for index, key in enumerate(keys):
+            if start <= index < end or query not in key:
+                continue
+            result.append(rows[index])
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+
+ingredient_index = IngredientIndex()
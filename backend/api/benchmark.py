@@ -0,0 +1,285 @@
+"""Нагрузочный прогон горячих эндпоинтов API в процессе.
+
+Запросы идут через django.test.Client, поэтому измеряется весь стек
+Django и DRF без сети. Для каждого сценария собираются задержки
+(p50/p95), число SQL-запросов и аллокации памяти.
+
+load() нагружает запущенный сервер параллельными запросами и сравнивает
+пропускную способность синхронных и асинхронных эндпоинтов.
+
+compare_serializers() сравнивает вывод и скорость сериализаторов и
+рендереров списка рецептов на уже загруженной странице.
+"""
+import statistics
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, reset_queries
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.renderers import ORJSONRenderer
+from api.serializers import RecipeGetSerializer, RecipeReadSerializer
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+ALLOCATION_ITERATIONS = 5
+
+
+def get_host():
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*']
+    return hosts[0].lstrip('.') if hosts else 'localhost'
+
+
+def get_client(user=None):
+    headers = {'HTTP_HOST': get_host()}
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        headers['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+    return Client(**headers)
+
+
+def get_benchmark_user():
+    return (
+        User.objects
+        .filter(favorites__isnull=False, Customer__isnull=False)
+        .order_by('pk')
+        .first()
+        or User.objects.order_by('pk').first()
+    )
+
+
+def get_scenarios():
+    """Пары (название, url, авторизованный ли запрос)."""
+    recipe = Recipe.objects.order_by('-favorites_count').first()
+    slugs = list(Tag.objects.values_list('slug', flat=True))
+    ingredient = Ingredient.objects.order_by('pk').first()
+    tags = '&'.join(f'tags={slug}' for slug in slugs[:2])
+    all_tags = '&'.join(f'tags={slug}' for slug in slugs)
+    prefix = ingredient.name[:3] if ingredient else 'а'
+    return [
+        ('recipes_list_anonymous', '/api/recipes/', False),
+        ('recipes_list', '/api/recipes/', True),
+        ('recipes_list_tags', f'/api/recipes/?{tags}', True),
+        ('recipes_list_all_tags', f'/api/recipes/?{all_tags}', True),
+        ('recipes_list_tags_deep_page',
+         f'/api/recipes/?{all_tags}&page=50', True),
+        ('recipes_list_favorited', '/api/recipes/?is_favorited=1', True),
+        ('recipes_list_in_cart', '/api/recipes/?is_in_shopping_cart=1',
+         True),
+        ('recipes_list_deep_page', '/api/recipes/?page=50', True),
+        ('recipe_detail', f'/api/recipes/{recipe.pk}/', True),
+        ('subscriptions', '/api/users/subscriptions/?recipes_limit=3', True),
+        ('download_shopping_cart',
+         '/api/recipes/download_shopping_cart/', True),
+        ('shopping_list', '/api/recipes/shopping_list/', True),
+        ('ingredients_search', f'/api/ingredients/?name={prefix}', False),
+    ]
+
+
+# Сценарии, у которых есть асинхронный вариант под /api/async/.
+ASYNC_SCENARIOS = (
+    'recipes_list_anonymous',
+    'recipes_list',
+    'recipes_list_tags',
+    'recipe_detail',
+    'subscriptions',
+    'ingredients_search',
+)
+
+
+def get_async_url(url):
+    return url.replace('/api/', '/api/async/', 1)
+
+
+def consume(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def measure(client, url, iterations, warmup=3):
+    for _ in range(warmup):
+        consume(client.get(url))
+
+    timings = []
+    status_code = None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = client.get(url)
+        consume(response)
+        timings.append((time.perf_counter() - started) * 1000)
+        status_code = response.status_code
+
+    queries = []
+    allocated = []
+    tracemalloc.start()
+    try:
+        for _ in range(ALLOCATION_ITERATIONS):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            with CaptureQueriesContext(connection) as context:
+                consume(client.get(url))
+            _, peak = tracemalloc.get_traced_memory()
+            queries.append(len(context))
+            allocated.append(peak - before)
+    finally:
+        tracemalloc.stop()
+        reset_queries()
+
+    return {
+        'url': url,
+        'status': status_code,
+        'iterations': iterations,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'queries': max(queries),
+        'peak_alloc_kb': round(max(allocated) / 1024, 1),
+    }
+
+
+def run(iterations=50, only=None):
+    user = get_benchmark_user()
+    clients = {False: get_client(), True: get_client(user)}
+    results = {}
+    for name, url, authenticated in get_scenarios():
+        if only and name not in only:
+            continue
+        results[name] = measure(clients[authenticated], url, iterations)
+    return results
+
+
+def fetch(url, headers):
+    started = time.perf_counter()
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status_code = response.status
+    except urllib.error.HTTPError as error:
+        status_code = error.code
+    return (time.perf_counter() - started) * 1000, status_code
+
+
+def load_url(url, headers, concurrency, requests):
+    """requests запросов к url из concurrency потоков одновременно."""
+    url = urllib.parse.quote(url, safe=':/?&=')
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(
+            lambda _: fetch(url, headers), range(requests)
+        ))
+    elapsed = time.perf_counter() - started
+    timings = [timing for timing, _ in results]
+    return {
+        'url': url,
+        'rps': round(requests / elapsed, 1),
+        'p50_ms': round(statistics.median(timings), 1),
+        'p95_ms': round(percentile(timings, 0.95), 1),
+        'errors': sum(status_code >= 400 for _, status_code in results),
+    }
+
+
+def load(base_url, async_base_url=None, concurrency=64, requests=1000,
+         only=None):
+    """Синхронный и асинхронный вариант каждого сценария под нагрузкой."""
+    base_url = base_url.rstrip('/')
+    async_base_url = (async_base_url or base_url).rstrip('/')
+    token, _ = Token.objects.get_or_create(user=get_benchmark_user())
+    results = {}
+    for name, url, authenticated in get_scenarios():
+        if name not in ASYNC_SCENARIOS or (only and name not in only):
+            continue
+        headers = (
+            {'Authorization': f'Token {token.key}'} if authenticated else {}
+        )
+        results[name] = {
+            'sync': load_url(
+                base_url + url, headers, concurrency, requests
+            ),
+            'async': load_url(
+                async_base_url + get_async_url(url),
+                headers, concurrency, requests,
+            ),
+        }
+    return results
+
+
+SERIALIZER_VARIANTS = (
+    ('drf_json', RecipeGetSerializer, JSONRenderer),
+    ('drf_orjson', RecipeGetSerializer, ORJSONRenderer),
+    ('fast_json', RecipeReadSerializer, JSONRenderer),
+    ('fast_orjson', RecipeReadSerializer, ORJSONRenderer),
+)
+
+
+def time_call(func, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def compare_serializers(iterations=50, page_size=50):
+    """Сериализация и рендеринг одной загруженной страницы рецептов.
+
+    Запросы к БД выполняются до замера; вывод всех вариантов
+    сравнивается с RecipeGetSerializer и JSONRenderer.
+    """
+    user = get_benchmark_user()
+    request = Request(
+        RequestFactory().get('/api/recipes/', HTTP_HOST=get_host())
+    )
+    request.user = user
+    recipes = list(
+        Recipe.objects.with_related()
+        .with_user_flags(user)[:page_size]
+    )
+    context = {'request': request}
+    expected = None
+    results = {}
+    for name, serializer_class, renderer_class in SERIALIZER_VARIANTS:
+        renderer = renderer_class()
+        serialize_ms, data = time_call(
+            lambda: serializer_class(recipes, many=True, context=context).data,
+            iterations,
+        )
+        render_ms, content = time_call(
+            lambda: renderer.render(data), iterations
+        )
+        if expected is None:
+            expected = content
+        total_ms = serialize_ms + render_ms
+        results[name] = {
+            'serialize_ms': round(serialize_ms, 3),
+            'render_ms': round(render_ms, 3),
+            'recipes_per_s': round(len(recipes) / total_ms * 1000),
+            'equal': content == expected,
+        }
+    return results
+
+
+def dataset_summary():
+    return {
+        'users': User.objects.count(),
+        'recipes': Recipe.objects.count(),
+        'tags': Tag.objects.count(),
+        'ingredients': Ingredient.objects.count(),
+    }
@@ -0,0 +1,288 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.renderers import ORJSONRenderer
+
+RECIPES_GENERATION = 'recipes'
+TAGS_GENERATION = 'tags'
+
+
+def recipe_generation(pk):
+    return f'recipe:{pk}'
+
+
+def user_generation(pk):
+    """Поколение данных пользователя: избранное, корзина, подписки."""
+    return f'user:{pk}'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE['ALIAS']]
+
+
+def is_shared_cache():
+    """Кэш общий для всех процессов приложения.
+
+    Поколения в кэше памяти процесса в каждом воркере свои: изменение,
+    сделанное в одном процессе, другие не видят.
+    """
+    return not isinstance(get_cache(), (LocMemCache, DummyCache))
+
+
+def _generation_key(name):
+    return f'generation:{name}'
+
+
+def get_generation(name):
+    """Текущее поколение данных name.
+
+    Начальное значение берется из времени, чтобы вытесненный из кэша
+    счетчик не вернулся к старому номеру и не поднял устаревшие ответы.
+    """
+    cache = get_cache()
+    key = _generation_key(name)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def get_generations(names):
+    """Поколения names одним обращением к кэшу."""
+    keys = [_generation_key(name) for name in names]
+    found = get_cache().get_many(keys)
+    return [
+        found[key] if key in found else get_generation(name)
+        for name, key in zip(names, keys)
+    ]
+
+
+def bump_generation(name):
+    cache = get_cache()
+    key = _generation_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = time.time_ns()
+        cache.set(key, generation, None)
+        return generation
+
+
+def normalize_query(query_params):
+    """Параметры запроса в каноничном виде: порядок ключей и значений
+    не влияет на ключ кэша, пустые значения отбрасываются."""
+    return '&'.join(
+        f'{key}={value}'
+        for key in sorted(query_params)
+        for value in sorted(set(query_params.getlist(key)))
+        if value != ''
+    )
+
+
+class ResponseCache:
+    """Кэш сериализованных ответов, сбрасываемый сменой поколения."""
+
+    def __init__(self, prefix, generation_name):
+        self.prefix = prefix
+        self.generation_name = generation_name
+
+    @property
+    def timeout(self):
+        return settings.RESPONSE_CACHE['TIMEOUT']
+
+    def make_key(self, request, generation_names=()):
+        raw = f'{request.path}?{normalize_query(request.query_params)}'
+        digest = hashlib.md5(raw.encode()).hexdigest()
+        generation = '-'.join(map(str, get_generations(
+            [self.generation_name, *generation_names]
+        )))
+        return f'response:{self.prefix}:{generation}:{digest}'
+
+    def get(self, key):
+        """Пара (etag, data) или None."""
+        entry = get_cache().get(key)
+        self._count('hits' if entry is not None else 'misses')
+        return entry
+
+    def set(self, key, data):
+        """Сохраняет data и возвращает ETag записи."""
+        etag = hashlib.md5(f'{key}:{time.time_ns()}'.encode()).hexdigest()
+        get_cache().set(key, (etag, data), self.timeout)
+        return etag
+
+    def _count(self, name):
+        cache = get_cache()
+        key = f'response:{self.prefix}:{name}'
+        if not cache.add(key, 1, None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+
+    def stats(self):
+        cache = get_cache()
+        return {
+            name: cache.get(f'response:{self.prefix}:{name}', 0)
+            for name in ('hits', 'misses')
+        }
+
+
+recipes_response_cache = ResponseCache('recipes', RECIPES_GENERATION)
+
+
+def make_etag(request, generation_names, media_type, user=None,
+              max_age=None):
+    """ETag ответа по адресу, поколениям данных и пользователю.
+
+    С max_age ETag меняется и раз в max_age секунд: так ограничивается
+    устаревание данных, которые не сбрасывают поколения.
+    """
+    window = int(time.time() // max_age) if max_age else None
+    raw = (
+        f'{request.path}?{normalize_query(request.query_params)}:'
+        f'{media_type}:{user.pk if user else None}:'
+        f'{get_generations(generation_names)}:{window}'
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def content_etag(content, media_type):
+    """ETag по телу ответа: не зависит от кэша, но требует сериализации."""
+    return hashlib.md5(f'{media_type}:'.encode() + content).hexdigest()
+
+
+def not_modified(request, etag):
+    """304, если If-None-Match совпадает с etag, иначе None."""
+    response = get_conditional_response(request, etag=quote_etag(etag))
+    if response is not None:
+        set_etag(response, etag)
+    return response
+
+
+def set_etag(response, etag, private=False):
+    """Клиент хранит ответ, но перед использованием сверяет ETag."""
+    response['ETag'] = quote_etag(etag)
+    patch_cache_control(response, no_cache=True, private=private or None)
+
+
+class ConditionalGetMixin:
+    """ETag для list и retrieve из поколений данных.
+
+    Совпавший If-None-Match получает 304 до запросов к БД и сериализации.
+    Без общего кэша или если get_etag_generations вернул None, ETag
+    считается по содержимому готового ответа.
+    """
+
+    etag_generations = ()
+    etag_per_user = False
+
+    def get_etag_max_age(self):
+        return None
+
+    def get_etag_generations(self):
+        names = list(self.etag_generations)
+        if self.etag_per_user and self.request.user.is_authenticated:
+            names.append(user_generation(self.request.user.pk))
+        return names
+
+    def get_etag(self, request):
+        if not is_shared_cache():
+            return None
+        names = self.get_etag_generations()
+        if names is None:
+            return None
+        return make_etag(
+            request, names, request.accepted_media_type,
+            user=request.user if self.etag_per_user else None,
+            max_age=self.get_etag_max_age(),
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        private = self.etag_per_user and request.user.is_authenticated
+        etag = self.get_etag(request)
+        response = None if etag is None else not_modified(request, etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                if etag is None:
+                    etag = content_etag(
+                        ORJSONRenderer().render(response.data),
+                        request.accepted_media_type,
+                    )
+                    response = not_modified(request, etag) or response
+                set_etag(response, etag, private=private)
+        if self.etag_per_user:
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class AnonymousResponseCacheMixin:
+    """Кэширует list и retrieve для анонимных пользователей.
+
+    У каждой записи свой ETag, так что повторный запрос с
+    If-None-Match получает 304 прямо из кэша.
+    """
+
+    response_cache = None
+
+    def get_cache_generations(self):
+        """Поколения, кроме общего, от которых зависит ответ."""
+        return ()
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(super().retrieve, request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Анонимным и авторизованным отдаются разные ответы.
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def _cached(self, handler, request, *args, **kwargs):
+        if (
+            not settings.RESPONSE_CACHE['ENABLED']
+            or self.response_cache is None
+            or not request.user.is_anonymous
+        ):
+            return handler(request, *args, **kwargs)
+        key = self.response_cache.make_key(
+            request, self.get_cache_generations()
+        )
+        entry = self.response_cache.get(key)
+        if entry is not None:
+            etag, data = entry
+            response = not_modified(request, etag) or Response(data)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            etag = self.response_cache.set(key, response.data)
+        if 'ETag' not in response:
+            set_etag(response, etag)
+        return response
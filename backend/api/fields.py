@@ -0,0 +1,116 @@
+import binascii
+import io
+import weakref
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import ImageField
+
+BASE64_MARKER = ';base64,'
+HEADER_LIMIT = 512 * 1024
+
+
+def close_temporary_file(file):
+    """Хранилище перемещает временный файл, поэтому при закрытии его
+    может уже не быть — как в TemporaryUploadedFile.close()."""
+    try:
+        file.close()
+    except FileNotFoundError:
+        pass
+
+
+class Base64ImageField(ImageField):
+    """Картинка в виде data URI.
+
+    base64 декодируется кусками по chunk_size символов во временный файл,
+    поэтому расход памяти на загрузку не зависит от размера картинки.
+    Размер файла проверяется до декодирования, формат и число пикселей —
+    по заголовку, как только он прочитан.
+    """
+
+    chunk_size = 64 * 1024
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('data:image'):
+            data = self.decode(data)
+        return super().to_internal_value(data)
+
+    def decode(self, data):
+        marker = data.find(BASE64_MARKER, 0, 64)
+        if marker == -1:
+            self.fail('invalid_image')
+        extension = data[len('data:image/'):marker]
+        start = marker + len(BASE64_MARKER)
+
+        limit = settings.RECIPE_IMAGE_LIMITS['MAX_BYTES']
+        encoded = (
+            len(data) - start
+            - data.count('\n', start) - data.count('\r', start)
+        )
+        if encoded // 4 * 3 > limit + 2:
+            raise ValidationError(
+                f'Картинка больше {limit / (1024 * 1024):.3g} МБ.'
+            )
+
+        upload = TemporaryUploadedFile(
+            f'temp.{extension}', f'image/{extension}', 0, None
+        )
+        weakref.finalize(upload, close_temporary_file, upload.file)
+        header = bytearray()
+        for text in self.iter_base64(data, start):
+            try:
+                chunk = binascii.a2b_base64(text)
+            except binascii.Error:
+                upload.close()
+                self.fail('invalid_image')
+            if header is not None:
+                header += chunk
+                if self.check_header(header, upload):
+                    header = None
+            upload.write(chunk)
+        if header is not None:
+            upload.close()
+            self.fail('invalid_image')
+
+        upload.size = upload.tell()
+        upload.seek(0)
+        return upload
+
+    def iter_base64(self, data, start):
+        """Куски base64 из data без пробелов и переносов строк.
+
+        Каждый кусок, кроме последнего, кратен четырем символам: перенос
+        строки внутри base64 в MIME-виде сдвигает границы, и остаток
+        куска переходит в следующий.
+        """
+        pending = ''
+        for offset in range(start, len(data), self.chunk_size):
+            text = pending + ''.join(
+                data[offset:offset + self.chunk_size].split()
+            )
+            cut = len(text) - len(text) % 4
+            yield text[:cut]
+            pending = text[cut:]
+        if pending:
+            yield pending
+
+    def check_header(self, header, upload):
+        """True, когда заголовок прочитан и картинка допустима."""
+        try:
+            with Image.open(io.BytesIO(header)) as image:
+                width, height = image.size
+        except (UnidentifiedImageError, SyntaxError, OSError):
+            if len(header) < HEADER_LIMIT:
+                return False
+            upload.close()
+            self.fail('invalid_image')
+
+        max_pixels = settings.RECIPE_IMAGE_LIMITS['MAX_PIXELS']
+        if width * height > max_pixels:
+            upload.close()
+            raise ValidationError(
+                f'Картинка больше {max_pixels // 1_000_000} мегапикселей.'
+            )
+        return True
@@ -1,7 +1,14 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, When
 from django_filters import rest_framework
 from django_filters.rest_framework import filters
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
 
-from recipes.models import Recipe, Tag
+from api.membership import get_membership
+from recipes.models import (SEARCH_CONFIG, Recipe, RecipeIngredient, RecipeTag,
+                            Tag)
 
 
 class RecipeFilter(rest_framework.FilterSet):
@@ -12,20 +19,89 @@ class RecipeFilter(rest_framework.FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        method='filter_tags',
     )
+    search = rest_framework.CharFilter(method='filter_search')
 
-    def filter_is_favorited(self, queryset, value, *args, **kwargs):
-        if value:
-            return queryset.filter(favorite__user=self.request.user)
-        return queryset
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_membership(queryset, value, 'favorites')
 
-    def filter_is_in_shopping_cart(self, queryset, value, *args, **kwargs):
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_membership(queryset, value, 'cart')
 
-        if value:
-            return queryset.filter(shopping_cart__user=self.request.user)
-        return queryset
+    def filter_membership(self, queryset, value, kind):
+        """Рецепты из множества kind пользователя — списком id."""
+        if not value:
+            return queryset
+        membership = get_membership(self.request)
+        members = getattr(membership, kind) if membership else None
+        if not members:
+            return queryset.none()
+        return queryset.filter(pk__in=members)
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов.
+
+        Полусоединение через EXISTS по индексу (tag, recipe): каждый
+        рецепт попадает в выдачу один раз без DISTINCT по всей строке.
+        """
+        if not value:
+            return queryset
+        return queryset.filter(Exists(
+            RecipeTag.objects.filter(recipe=OuterRef('pk'), tag__in=value)
+        ))
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск с сортировкой по релевантности.
+
+        Без PostgreSQL — поиск по подстроке в названии, описании и
+        ингредиентах; выше рецепты с совпадением в названии.
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+        if connections[queryset.db].vendor == 'postgresql':
+            query = SearchQuery(
+                value, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            return queryset.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query)
+            ).order_by('-search_rank', '-pub_date')
+        in_ingredients = RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredient__name__icontains=value
+        )
+        return queryset.filter(
+            Q(name__icontains=value)
+            | Q(text__icontains=value)
+            | Exists(in_ingredients)
+        ).annotate(
+            search_rank=Case(
+                When(name__icontains=value, then=1),
+                default=0,
+                output_field=IntegerField(),
+            )
+        ).order_by('-search_rank', '-pub_date')
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'is_favorited', 'is_in_shopping_cart', 'author')
+        fields = (
+            'tags', 'is_favorited', 'is_in_shopping_cart', 'author', 'search'
+        )
+
+
+class IngredientSearchFilter(BaseFilterBackend):
+    """Поиск ингредиентов в БД: сначала совпадения по началу названия,
+    затем по подстроке."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(api_settings.SEARCH_PARAM)
+        if not query:
+            return queryset
+        return queryset.filter(name__icontains=query).annotate(
+            prefix_rank=Case(
+                When(name__istartswith=query, then=0),
+                default=1,
+                output_field=IntegerField(),
+            )
+        ).order_by('prefix_rank', 'name')
@@ -0,0 +1,229 @@
+"""Профилирование запросов: число и время SQL, повторяющиеся запросы
+(признак N+1), время view и методов сериализаторов.
+
+Метрики других слоев собираются через foodgram.timing.record_timing.
+Результат уходит в структурированный лог foodgram.performance, а при
+включенном SERVER_TIMING — в заголовок Server-Timing ответов в режиме
+DEBUG и ответов персоналу: в нем видны число запросов и имена
+сериализаторов.
+"""
+import asyncio
+import functools
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from foodgram.timing import collect_timings
+
+logger = logging.getLogger('foodgram.performance')
+
+_current_profile = ContextVar('request_profile', default=None)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL без литералов и длины IN-списков: запросы, отличающиеся
+    только параметрами, получают одинаковый отпечаток."""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _LITERALS.sub('?', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class RequestProfile:
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+        self.scopes = []
+        self.scope_stats = defaultdict(lambda: {'calls': 0, 'queries': 0,
+                                                'time': 0.0})
+        self.timings = {}
+        # Асинхронные view выполняют запросы из нескольких потоков сразу.
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            with self.lock:
+                self.queries += 1
+                self.db_time += duration
+                self.fingerprints[fingerprint(sql)] += 1
+                if self.scopes:
+                    self.scope_stats[self.scopes[-1]]['queries'] += 1
+
+    def duplicates(self):
+        threshold = settings.INSTRUMENTATION['DUPLICATE_THRESHOLD']
+        return [
+            {'count': count, 'sql': sql}
+            for sql, count in self.fingerprints.most_common()
+            if count >= threshold
+        ]
+
+
+@contextmanager
+def profile_queries():
+    """Передает SQL соединений текущего потока в профиль запроса.
+
+    Нужно там, где запросы к БД выполняются не в потоке middleware,
+    например в пуле потоков асинхронных view.
+    """
+    profile = _current_profile.get()
+    with ExitStack() as stack:
+        if profile is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+        yield
+
+
+def profiled(method):
+    """Считает вызовы, время и SQL-запросы метода сериализатора."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return method(self, *args, **kwargs)
+        scope = f'{type(self).__name__}.{method.__name__}'
+        profile.scopes.append(scope)
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            profile.scopes.pop()
+            stats = profile.scope_stats[scope]
+            stats['calls'] += 1
+            stats['time'] += time.perf_counter() - started
+
+    return wrapper
+
+
+def server_timing(profile, total):
+    metrics = [
+        f'db;dur={profile.db_time * 1000:.1f};'
+        f'desc="{profile.queries} queries"',
+        f'app;dur={total * 1000:.1f}',
+    ]
+    for name, (duration, description) in profile.timings.items():
+        metric = f'{name};dur={duration * 1000:.1f}'
+        if description:
+            metric += f';desc="{description}"'
+        metrics.append(metric)
+    for scope, stats in profile.scope_stats.items():
+        metrics.append(
+            f'{scope.replace(".", "-")};dur={stats["time"] * 1000:.1f};'
+            f'desc="{stats["calls"]} calls, {stats["queries"]} queries"'
+        )
+    return ', '.join(metrics)
+
+
+class QueryInstrumentationMiddleware:
+    """Профилирует долю sample_rate запросов и логирует медленные."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Признак, по которому Django вызывает middleware асинхронно.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        config = settings.INSTRUMENTATION
+        if not config['ENABLED']:
+            return self.get_response(request)
+
+        profile = self.start_profile(config)
+        started = time.perf_counter()
+        token = _current_profile.set(profile)
+        try:
+            with profile_queries(), collect_timings(
+                profile.timings if profile else None
+            ):
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile, started, config)
+
+    async def __acall__(self, request):
+        config = settings.INSTRUMENTATION
+        if not config['ENABLED']:
+            return await self.get_response(request)
+
+        # SQL попадает в профиль из потоков, где его выполняют view.
+        profile = self.start_profile(config)
+        started = time.perf_counter()
+        token = _current_profile.set(profile)
+        try:
+            with collect_timings(profile.timings if profile else None):
+                response = await self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile, started, config)
+
+    def start_profile(self, config):
+        if random.random() < config['SAMPLE_RATE']:
+            return RequestProfile()
+        return None
+
+    def finish(self, request, response, profile, started, config):
+        total = time.perf_counter() - started
+        slow = total * 1000 >= config['SLOW_REQUEST_MS']
+        if profile is not None:
+            if self.show_server_timing(request, config):
+                response['Server-Timing'] = server_timing(profile, total)
+            self.log(request, response, total, profile, slow)
+        elif slow:
+            self.log(request, response, total, None, slow)
+        return response
+
+    def show_server_timing(self, request, config):
+        # Пользователя по токену DRF проставляет и исходному запросу.
+        user = getattr(request, 'user', None)
+        return config['SERVER_TIMING'] and (
+            settings.DEBUG or getattr(user, 'is_staff', False)
+        )
+
+    def log(self, request, response, total, profile, slow):
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view': getattr(request, 'resolver_match', None)
+            and request.resolver_match.view_name,
+            'duration_ms': round(total * 1000, 1),
+        }
+        if profile is not None:
+            record.update({
+                'queries': profile.queries,
+                'db_ms': round(profile.db_time * 1000, 1),
+                'duplicates': profile.duplicates(),
+                'timings': {
+                    name: round(duration * 1000, 1)
+                    for name, (duration, _) in profile.timings.items()
+                },
+                'serializer_methods': {
+                    scope: {**stats, 'time': round(stats['time'] * 1000, 1)}
+                    for scope, stats in profile.scope_stats.items()
+                },
+            })
+        level = logging.WARNING if slow else logging.INFO
+        logger.log(level, json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,129 @@
+"""Избранное, корзина и подписки пользователя в виде множеств id.
+
+Флаги is_favorited, is_in_shopping_cart и is_subscribed проверяются по
+этим множествам без запросов к БД. Множества живут в кэше с ограниченным
+сроком и сбрасываются после коммита, когда пользователь добавляет или
+убирает рецепт или подписку; за одну обработку запроса кэш читается один
+раз.
+
+Сброс увеличивает поколение множества, как у снимков токенов в
+api.authentication: запрос, который прочитал множество из БД до коммита,
+а записал его в кэш после сброса, удаляет свою запись.
+"""
+from django.conf import settings
+
+from api.cache import (bump_generation, get_cache, get_generation,
+                       is_shared_cache)
+from recipes.models import RecipeFavorite, ShoppingCart
+from users.models import Subscription
+
+FAVORITES = 'favorites'
+CART = 'cart'
+SUBSCRIPTIONS = 'subscriptions'
+
+SOURCES = {
+    FAVORITES: (RecipeFavorite, 'favorite_recipe_id'),
+    CART: (ShoppingCart, 'recipe_buy_id'),
+    SUBSCRIPTIONS: (Subscription, 'author_id'),
+}
+
+
+def is_enabled():
+    """Множества кэшируются только в общем кэше: в кэше памяти процесса
+    сброс не доходит до других процессов, и они до TIMEOUT отдавали бы
+    неверные флаги и фильтр ?is_favorited=1."""
+    return settings.MEMBERSHIP_CACHE['ENABLED'] and is_shared_cache()
+
+
+def _key(user_id, kind):
+    return f'membership:{user_id}:{kind}'
+
+
+def _generation(user_id, kind):
+    return f'membership:{user_id}:{kind}'
+
+
+def load(user_id, kind):
+    model, field = SOURCES[kind]
+    return frozenset(
+        model.objects.filter(user_id=user_id).values_list(field, flat=True)
+    )
+
+
+class Membership:
+    """Множества одного пользователя, загружаемые при первом обращении."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._sets = None
+
+    @property
+    def favorites(self):
+        return self.get(FAVORITES)
+
+    @property
+    def cart(self):
+        return self.get(CART)
+
+    @property
+    def subscriptions(self):
+        return self.get(SUBSCRIPTIONS)
+
+    def missing(self):
+        """Виды множеств, которых нет в кэше; их загрузит get()."""
+        if self._sets is None:
+            self._sets = self._read_cache()
+        return [kind for kind in SOURCES if kind not in self._sets]
+
+    def get(self, kind):
+        if self._sets is None:
+            self._sets = self._read_cache()
+        if kind not in self._sets:
+            if is_enabled():
+                self._sets[kind] = self._load_and_store(kind)
+            else:
+                self._sets[kind] = load(self.user_id, kind)
+        return self._sets[kind]
+
+    def _load_and_store(self, kind):
+        """Читает множество из БД и кладет его в кэш.
+
+        Если множество сбросили между чтением и записью, запись
+        удаляется; сам запрос пользуется прочитанным множеством.
+        """
+        generation = get_generation(_generation(self.user_id, kind))
+        members = load(self.user_id, kind)
+        cache = get_cache()
+        key = _key(self.user_id, kind)
+        cache.set(key, members, settings.MEMBERSHIP_CACHE['TIMEOUT'])
+        if get_generation(_generation(self.user_id, kind)) != generation:
+            cache.delete(key)
+        return members
+
+    def _read_cache(self):
+        if not is_enabled():
+            return {}
+        keys = {_key(self.user_id, kind): kind for kind in SOURCES}
+        return {
+            keys[key]: members
+            for key, members in get_cache().get_many(keys).items()
+        }
+
+
+def get_membership(request):
+    """Множества текущего пользователя или None для анонима."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    if getattr(user, '_membership', None) is None:
+        user._membership = Membership(user.pk)
+    return user._membership
+
+
+def invalidate(user_id, kind):
+    """Сбрасывает множество kind пользователя, его перечитает следующий
+    запрос."""
+    if not is_enabled():
+        return
+    bump_generation(_generation(user_id, kind))
+    get_cache().delete(_key(user_id, kind))
@@ -0,0 +1,162 @@
+import abc
+import csv
+import io
+import os
+import tempfile
+
+import orjson
+from django.conf import settings
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+SHOPPING_LIST_TITLE = 'Ваш список покупок'
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с тем же выводом.
+
+    Даты и типы, которых нет в JSON, по-прежнему форматирует
+    JSONEncoder DRF. Отступы (браузерный API), ensure_ascii и
+    некомпактный вывод orjson не повторяет — их рендерит DRF.
+    """
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        ret = orjson.dumps(
+            data, default=self.encoder_class().default, option=self.options
+        )
+        # Как и DRF, экранируем разделители строк, недопустимые в JS.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029'
+        )
+
+
+class ShoppingListRenderer(BaseRenderer, abc.ABC):
+    """Рендерер списка покупок из строк (название, единицы, количество).
+
+    stream() отдает документ частями для StreamingHttpResponse.
+    """
+
+    charset = 'utf-8'
+    extension = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b''.join(self.stream(data))
+
+    @abc.abstractmethod
+    def stream(self, rows):
+        """Итератор байтов документа."""
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    extension = 'txt'
+
+    def stream(self, rows):
+        yield f'{SHOPPING_LIST_TITLE}:\n'.encode()
+        for number, (name, unit, amount) in enumerate(rows, start=1):
+            yield f'{number} - {name} ({unit}) - {amount}\n'.encode()
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    extension = 'csv'
+
+    def stream(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(('Ингредиент', 'Единицы измерения', 'Количество'))
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue().encode()
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """PDF списка покупок.
+
+    reportlab пишет документ целиком в canvas.save(), поэтому stream()
+    отдает части только после того, как собран весь PDF: страницы до
+    сохранения держит в памяти сам canvas. Готовый файл лежит во
+    временном файле, который уходит на диск больше spool_size байт.
+    """
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    extension = 'pdf'
+    charset = None
+    chunk_size = 64 * 1024
+    spool_size = 1024 * 1024
+    font_name = 'ShoppingListFont'
+
+    def get_font(self):
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if not os.path.exists(font_path):
+            return 'Helvetica'
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+        return self.font_name
+
+    def stream(self, rows):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfgen import canvas
+
+        with tempfile.SpooledTemporaryFile(self.spool_size) as buffer:
+            pdf = canvas.Canvas(buffer, pagesize=A4)
+            font = self.get_font()
+            width, height = A4
+            top, bottom, left, line_height = height - 60, 50, 50, 18
+
+            pdf.setFont(font, 16)
+            pdf.drawString(left, top, SHOPPING_LIST_TITLE)
+            pdf.setFont(font, 12)
+            y = top - 2 * line_height
+            for number, (name, unit, amount) in enumerate(rows, start=1):
+                if y < bottom:
+                    pdf.showPage()
+                    pdf.setFont(font, 12)
+                    y = top
+                pdf.drawString(
+                    left, y, f'{number}. {name} ({unit}) — {amount}'
+                )
+                y -= line_height
+            pdf.save()
+
+            buffer.seek(0)
+            while chunk := buffer.read(self.chunk_size):
+                yield chunk
+
+
+class ShoppingListContentNegotiation(DefaultContentNegotiation):
+    """Формат выбирается параметром ?format=, без него — первый рендерер,
+    даже если заголовок Accept ему не соответствует."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format_query_param = self.settings.URL_FORMAT_OVERRIDE
+        export_format = format_suffix or request.query_params.get(
+            format_query_param
+        )
+        if export_format:
+            renderers = self.filter_renderers(renderers, export_format)
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
@@ -1,15 +1,19 @@
-import base64
-
-from django.core.files.base import ContentFile
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import IntegerField, SerializerMethodField
-from rest_framework.serializers import (ImageField, ModelSerializer,
+from rest_framework.serializers import (ModelSerializer,
                                         PrimaryKeyRelatedField, ReadOnlyField)
 
+from api.cache import RECIPES_GENERATION, bump_generation
+from api.fields import Base64ImageField
+from api.instrumentation import profiled
+from api.membership import get_membership
+from recipes.images import get_srcset
 from recipes.models import (Ingredient, Recipe, RecipeFavorite,
-                            RecipeIngredient, ShoppingCart, Tag)
+                            RecipeIngredient, ShoppingCart, ShoppingListItem,
+                            Tag)
 from users.models import Subscription, User
 
 
@@ -23,12 +27,12 @@ class CustomUserSerializer(UserSerializer):
             'last_name', 'is_subscribed'
         )
 
+    @profiled
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return Subscription.objects.filter(
-            user=request.user, author=obj).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        membership = get_membership(self.context.get('request'))
+        return membership is not None and obj.pk in membership.subscriptions
 
 
 class TagSerializer(ModelSerializer):
@@ -52,27 +56,22 @@ class RecipeIngredientPostSerializer(ModelSerializer):
         fields = ('id', 'amount',)
 
 
-class Base64ImageField(ImageField):
-
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
-        return super().to_internal_value(data)
-
-
 class RecipeSerializer(ModelSerializer):
+    image_srcset = SerializerMethodField()
+
     class Meta:
         model = Recipe
         fields = (
             'id',
             'name',
             'image',
+            'image_srcset',
             'cooking_time',
         )
 
+    def get_image_srcset(self, obj):
+        return get_srcset(obj, self.context.get('request'))
+
 
 class RecipeIngredientSerializer(ModelSerializer):
     id = ReadOnlyField(source='ingredient.id')
@@ -96,34 +95,120 @@ class RecipeGetSerializer(ModelSerializer):
     # image = Base64ImageField()
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
+    image_srcset = SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
+            'is_in_shopping_cart', 'name', 'image', 'image_srcset', 'text',
+            'cooking_time', 'favorites_count',
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
+    @profiled
     def get_ingredients(self, obj):
-        ingredients = RecipeIngredient.objects.filter(recipe=obj)
+        ingredients = obj.recipeingredient.all()
 
         return RecipeIngredientSerializer(ingredients, many=True).data
 
+    def get_image_srcset(self, obj):
+        return get_srcset(obj, self.context.get('request'))
+
+    @profiled
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return RecipeFavorite.objects.filter(
-            favorite_recipe=obj, user=request.user
-        ).exists()
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        membership = get_membership(self.context.get('request'))
+        return membership is not None and obj.pk in membership.favorites
 
+    @profiled
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        membership = get_membership(self.context.get('request'))
+        return membership is not None and obj.pk in membership.cart
+
+
+class RecipeReadSerializer(serializers.BaseSerializer):
+    """Тот же ответ, что у RecipeGetSerializer, без полей DRF.
+
+    Словари собираются прямо из рецептов with_related(): на страницу
+    рецептов не создаются вложенные сериализаторы и поля.
+    """
+
+    @profiled
+    def to_representation(self, recipe):
         request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return ShoppingCart.objects.filter(
-            recipe_buy=obj, user=request.user
-        ).exists()
+        membership = get_membership(request)
+        author = recipe.author
+        if hasattr(recipe, 'author_is_subscribed'):
+            is_subscribed = recipe.author_is_subscribed
+        elif hasattr(author, 'is_subscribed'):
+            is_subscribed = author.is_subscribed
+        else:
+            is_subscribed = (
+                membership is not None
+                and author.pk in membership.subscriptions
+            )
+        return {
+            'id': recipe.pk,
+            'tags': [
+                {
+                    'id': tag.pk,
+                    'name': tag.name,
+                    'color': tag.color,
+                    'slug': tag.slug,
+                }
+                for tag in recipe.tags.all()
+            ],
+            'author': {
+                'email': author.email,
+                'id': author.pk,
+                'username': author.username,
+                'first_name': author.first_name,
+                'last_name': author.last_name,
+                'is_subscribed': is_subscribed,
+            },
+            'ingredients': [
+                {
+                    'id': item.ingredient.pk,
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in recipe.recipeingredient.all()
+            ],
+            'is_favorited': self.get_flag(
+                recipe, 'is_favorited', membership, 'favorites'
+            ),
+            'is_in_shopping_cart': self.get_flag(
+                recipe, 'is_in_shopping_cart', membership, 'cart'
+            ),
+            'name': recipe.name,
+            'image': self.get_image_url(recipe.image, request),
+            'image_srcset': get_srcset(recipe, request),
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'favorites_count': recipe.favorites_count,
+        }
+
+    def get_flag(self, recipe, attribute, membership, kind):
+        if hasattr(recipe, attribute):
+            return getattr(recipe, attribute)
+        return membership is not None and recipe.pk in getattr(
+            membership, kind
+        )
+
+    def get_image_url(self, image, request):
+        # Как ImageField DRF с UPLOADED_FILES_USE_URL.
+        if not image:
+            return None
+        return request.build_absolute_uri(image.url) if request else image.url
 
 
 class RecipePostPatchDelSerializer(ModelSerializer):
@@ -163,37 +248,94 @@ class RecipePostPatchDelSerializer(ModelSerializer):
                     'Ингредиентов должно быть больше нуля).'
                 )
 
+        existing = set(
+            Ingredient.objects
+            .filter(id__in=ingredients_list)
+            .values_list('id', flat=True)
+        )
+        missing = [pk for pk in ingredients_list if pk not in existing]
+        if missing:
+            raise ValidationError(
+                f'Ингредиенты не найдены: {", ".join(map(str, missing))}.'
+            )
+
         return data
 
-    def create_update_ingredients(self, recipe, ingredients):
-        for ingredient in ingredients:
-            current_ingredient = Ingredient.objects.get(id=ingredient['id'])
-            RecipeIngredient.objects.create(
-                ingredient=current_ingredient,
+    def create_update_ingredients(self, recipe, ingredients, created=False):
+        """Сохраняет ингредиенты рецепта, меняя только отличающиеся строки."""
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current = {} if created else {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipeingredient.all()
+        }
+
+        removed = current.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+
+        changed = []
+        # bulk_update и bulk_create не шлют сигналов, поэтому списки
+        # покупок меняются здесь; удаленные строки вычитает сигнал.
+        shopping_list_changes = {}
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                shopping_list_changes[ingredient_id] = (
+                    amount - recipe_ingredient.amount, 0
+                )
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
                 recipe=recipe,
-                amount=ingredient['amount'],
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        )
+        if not created:
+            shopping_list_changes.update(
+                (ingredient_id, (amount, 1))
+                for ingredient_id, amount in amounts.items()
+                if ingredient_id not in current
+            )
+            ShoppingListItem.objects.add_amounts(
+                ShoppingCart.objects.filter(recipe_buy=recipe).values('user'),
+                shopping_list_changes,
             )
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('recipeingredient')
         tags = validated_data.pop('tags')
         author = self.context.get('request').user
         recipe = Recipe.objects.create(author=author, **validated_data)
-        self.create_update_ingredients(recipe, ingredients)
+        self.create_update_ingredients(recipe, ingredients, created=True)
         recipe.tags.set(tags)
+        transaction.on_commit(lambda: bump_generation(RECIPES_GENERATION))
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('recipeingredient')
-        instance.tags.clear()
-        instance.ingredients.clear()
         self.create_update_ingredients(instance, ingredients)
         instance.tags.set(tags)
-        return super().update(instance, validated_data)
+        recipe = super().update(instance, validated_data)
+        transaction.on_commit(lambda: bump_generation(RECIPES_GENERATION))
+        return recipe
 
     def to_representation(self, instance):
-        return RecipeGetSerializer(instance).data
+        return RecipeGetSerializer(instance, context=self.context).data
 
 
 class RecipeFavoriteSerializer(ModelSerializer):
@@ -259,6 +401,22 @@ class ShoppingChartSerializer(ModelSerializer):
         )
 
 
+class ShoppingListItemSerializer(ModelSerializer):
+    id = ReadOnlyField(source='ingredient.id')
+    name = ReadOnlyField(source='ingredient.name')
+    measurement_unit = ReadOnlyField(source='ingredient.measurement_unit')
+
+    class Meta:
+        model = ShoppingListItem
+        fields = (
+            'id',
+            'name',
+            'measurement_unit',
+            'amount',
+            'recipes_count',
+        )
+
+
 class CustomCreateUserSerializer(UserCreateSerializer):
     class Meta:
         model = User
@@ -268,11 +426,23 @@ class CustomCreateUserSerializer(UserCreateSerializer):
         )
 
 
+RECIPES_LIMIT_DEFAULT = 3
+
+
+def get_recipes_limit(request):
+    """Значение recipes_limit из запроса, по умолчанию три рецепта."""
+    try:
+        limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return RECIPES_LIMIT_DEFAULT
+    return limit if limit >= 0 else RECIPES_LIMIT_DEFAULT
+
+
 class SubscriptionSerializer(ModelSerializer):
     """Получение подписок пользователя."""
 
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
+    recipes_count = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -282,21 +452,24 @@ class SubscriptionSerializer(ModelSerializer):
             'last_name', 'is_subscribed', 'recipes', 'recipes_count',
         )
 
+    @profiled
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return Subscription.objects.filter(
-            user=request.user, author=obj).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        membership = get_membership(self.context.get('request'))
+        return membership is not None and obj.pk in membership.subscriptions
 
+    @profiled
     def get_recipes(self, obj):
-        recipes = Recipe.objects.filter(author=obj)[:3]
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            recipes = Recipe.objects.filter(author=obj)[
+                :self.context.get('recipes_limit', RECIPES_LIMIT_DEFAULT)
+            ]
         if not recipes:
             return False
-        return RecipeSerializer(recipes, many=True).data
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+        return RecipeSerializer(recipes, many=True, context=self.context).data
 
 
 class SubscribeSerializer(ModelSerializer):
@@ -318,5 +491,5 @@ class SubscribeSerializer(ModelSerializer):
     def to_representation(self, instance):
         return SubscriptionSerializer(
             instance.author,
-            context={'user': instance.user}
+            context={'user': instance.user, **self.context}
         ).data
@@ -0,0 +1,26 @@
+import hashlib
+
+from recipes.models import ShoppingListItem
+
+
+def shopping_list_queryset(user):
+    """Список покупок user из предрасчитанных строк."""
+    return (
+        ShoppingListItem.objects
+        .filter(user=user)
+        .values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+    )
+
+
+def get_shopping_list(user):
+    return list(shopping_list_queryset(user))
+
+
+def get_shopping_list_etag(rows, export_format):
+    digest = hashlib.md5(export_format.encode())
+    for row in rows:
+        digest.update(repr(row).encode())
+    return digest.hexdigest()
@@ -0,0 +1,131 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api import authentication, membership
+from api.autocomplete import INGREDIENTS_GENERATION
+from api.cache import (RECIPES_GENERATION, TAGS_GENERATION, bump_generation,
+                       recipe_generation, user_generation)
+from recipes.models import (Ingredient, Recipe, RecipeFavorite, ShoppingCart,
+                            Tag)
+from users.models import Subscription, User
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+def bump_on_commit(*names):
+    transaction.on_commit(
+        lambda: [bump_generation(name) for name in names]
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_recipes_cache(**kwargs):
+    bump_generation(RECIPES_GENERATION)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    bump_generation(INGREDIENTS_GENERATION)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(**kwargs):
+    bump_generation(TAGS_GENERATION)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    bump_on_commit(RECIPES_GENERATION, recipe_generation(instance.pk))
+
+
+# Общее поколение не сбрасывается: иначе каждый клик по избранному
+# очищал бы весь кэш списков. Счетчики в списках отстают не больше чем
+# на RESPONSE_CACHE['TIMEOUT'].
+@receiver(post_save, sender=RecipeFavorite)
+@receiver(post_delete, sender=RecipeFavorite)
+def invalidate_favorite(instance, **kwargs):
+    bump_on_commit(
+        recipe_generation(instance.favorite_recipe_id),
+        user_generation(instance.user_id),
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def invalidate_shopping_cart(instance, **kwargs):
+    bump_on_commit(
+        recipe_generation(instance.recipe_buy_id),
+        user_generation(instance.user_id),
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(instance, created, update_fields, **kwargs):
+    # Данные автора входят в ответы с его рецептами; last_login при
+    # входе и счетчики в них не показываются.
+    if created or (
+        update_fields is not None
+        and not AUTHOR_FIELDS.intersection(update_fields)
+    ):
+        return
+    bump_on_commit(RECIPES_GENERATION)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscription(instance, **kwargs):
+    bump_on_commit(user_generation(instance.user_id))
+
+
+def invalidate_membership_on_commit(user_id, kind):
+    transaction.on_commit(lambda: membership.invalidate(user_id, kind))
+
+
+@receiver(post_save, sender=RecipeFavorite)
+@receiver(post_delete, sender=RecipeFavorite)
+def invalidate_favorites(instance, **kwargs):
+    invalidate_membership_on_commit(instance.user_id, membership.FAVORITES)
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def invalidate_cart(instance, **kwargs):
+    invalidate_membership_on_commit(instance.user_id, membership.CART)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscriptions(instance, **kwargs):
+    invalidate_membership_on_commit(
+        instance.user_id, membership.SUBSCRIPTIONS
+    )
+
+
+def invalidate_tokens_on_commit(keys):
+    transaction.on_commit(lambda: authentication.invalidate(keys))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    invalidate_tokens_on_commit([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, created, using, **kwargs):
+    # Смена пароля, деактивация и другие правки пользователя.
+    if created:
+        return
+    invalidate_tokens_on_commit(list(
+        Token.objects.using(using)
+        .filter(user_id=instance.pk)
+        .values_list('key', flat=True)
+    ))
@@ -0,0 +1,33 @@
+import threading
+
+import pytest
+
+from api import membership
+from recipes.models import RecipeFavorite, ShoppingCart
+from users.models import Subscription
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def test_user_sets_load_concurrently(user, author, user_client,
+                                     make_recipes, monkeypatch):
+    recipe, = make_recipes(1)
+    RecipeFavorite.objects.create(user=user, favorite_recipe=recipe)
+    ShoppingCart.objects.create(user=user, recipe_buy=recipe)
+    Subscription.objects.create(user=user, author=author)
+    # Каждая загрузка ждет остальные: последовательные упали бы по
+    # таймауту.
+    barrier = threading.Barrier(len(membership.SOURCES), timeout=5)
+    load = membership.load
+
+    def load_together(user_id, kind):
+        barrier.wait()
+        return load(user_id, kind)
+
+    monkeypatch.setattr(membership, 'load', load_together)
+    response = user_client.get('/api/async/recipes/')
+    assert response.status_code == 200
+    data = response.json()['results'][0]
+    assert data['is_favorited'] is True
+    assert data['is_in_shopping_cart'] is True
+    assert data['author']['is_subscribed'] is True
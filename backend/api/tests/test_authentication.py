@@ -0,0 +1,196 @@
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import authentication
+from api.authentication import CachedTokenAuthentication, LRUCache
+from conftest import PASSWORD
+from recipes.models import Recipe
+from users.models import Subscription
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(autouse=True)
+def clear_tokens():
+    authentication.local_tokens.clear()
+
+
+@pytest.fixture
+def token_settings(settings):
+    def configure(**options):
+        settings.TOKEN_AUTH = {**settings.TOKEN_AUTH, **options}
+    return configure
+
+
+def token_queries(client):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get('/api/users/me/')
+    return response, [
+        query for query in context.captured_queries
+        if 'authtoken_token' in query['sql']
+    ]
+
+
+def token_client(key):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+    return client
+
+
+def login(user):
+    return APIClient().post(
+        '/api/auth/token/login/', {'email': user.email, 'password': PASSWORD}
+    )
+
+
+def test_cache_hit_without_query(user, user_client):
+    response, queries = token_queries(user_client)
+    assert response.status_code == 200
+    assert len(queries) == 1
+    response, queries = token_queries(user_client)
+    assert response.json()['email'] == user.email
+    assert queries == []
+
+
+def test_user_changes_invalidate(user, user_client):
+    user_client.get('/api/users/me/')
+    user.first_name = 'Новое'
+    user.save()
+    response, queries = token_queries(user_client)
+    assert response.json()['first_name'] == 'Новое'
+    assert len(queries) == 1
+
+    response = user_client.post('/api/users/set_password/', {
+        'new_password': 'N3w-pa55word', 'current_password': PASSWORD,
+    })
+    assert response.status_code == 204
+    user.refresh_from_db()
+    assert user.check_password('N3w-pa55word')
+
+    user.is_active = False
+    user.save()
+    assert user_client.get('/api/users/me/').status_code == 401
+
+
+def test_snapshot_user_keeps_password(user, user_client):
+    key = Token.objects.get(user=user).key
+    cached_user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+    cached_user.first_name = 'Новое'
+    cached_user.save()
+    user.refresh_from_db()
+    assert user.check_password(PASSWORD)
+
+
+def test_snapshot_user_keeps_counters(user, author, user_client):
+    user_client.get('/api/users/me/')
+    Subscription.objects.create(user=author, author=user)
+    Recipe.objects.create(
+        author=user, name='Рецепт', text='Текст', cooking_time=10,
+        image='recipes/image.png',
+    )
+    response = user_client.patch('/api/users/me/', {'first_name': 'Новое'})
+    assert response.status_code == 200
+    user.refresh_from_db()
+    assert user.first_name == 'Новое'
+    assert (user.recipes_count, user.followers_count) == (1, 1)
+
+
+def test_logout_and_rotate(user, user_client):
+    user_client.get('/api/users/me/')
+    old_key = Token.objects.get(user=user).key
+    response = user_client.post('/api/auth/token/rotate/')
+    assert response.status_code == 200
+    new_key = response.json()['auth_token']
+    assert new_key != old_key
+    assert user_client.get('/api/users/me/').status_code == 401
+
+    client = token_client(new_key)
+    assert client.get('/api/users/me/').status_code == 200
+    assert client.post('/api/auth/token/logout/').status_code == 204
+    assert client.get('/api/users/me/').status_code == 401
+
+
+@pytest.mark.parametrize('shared', [False, True])
+def test_expired_token(shared, user, monkeypatch, token_settings):
+    token_settings(EXPIRES_AFTER=3600, SHARED_CACHE=shared)
+    key = login(user).json()['auth_token']
+    client = token_client(key)
+    assert client.get('/api/users/me/').status_code == 200
+    # Истечение проверяется и для снимка из кэша.
+    later = timezone.now() + timedelta(hours=2)
+    monkeypatch.setattr(authentication.timezone, 'now', lambda: later)
+    assert client.get('/api/users/me/').status_code == 401
+    assert not Token.objects.filter(key=key).exists()
+
+
+def test_login_replaces_expired_unused_token(user, token_settings):
+    token_settings(EXPIRES_AFTER=3600)
+    key = login(user).json()['auth_token']
+    assert login(user).json()['auth_token'] == key
+    Token.objects.filter(key=key).update(
+        created=timezone.now() - timedelta(hours=2)
+    )
+    new_key = login(user).json()['auth_token']
+    assert new_key != key
+    assert token_client(new_key).get('/api/users/me/').status_code == 200
+
+
+def test_shared_cache(user, token_settings):
+    token_settings(SHARED_CACHE=True)
+    key = Token.objects.create(user=user).key
+    client = token_client(key)
+    client.get('/api/users/me/')
+    authentication.local_tokens.clear()
+    response, queries = token_queries(client)
+    assert response.status_code == 200
+    assert queries == []
+    Token.objects.filter(key=key).delete()
+    assert client.get('/api/users/me/').status_code == 401
+
+
+@pytest.mark.parametrize('shared', [False, True])
+def test_invalidation_during_load_is_not_cached(shared, user, monkeypatch,
+                                                token_settings):
+    # Деактивация коммитится, пока запрос читает старый снимок из БД.
+    token_settings(SHARED_CACHE=shared)
+    key = Token.objects.create(user=user).key
+    load = CachedTokenAuthentication.load
+
+    def load_then_deactivate(self, token_key):
+        entry = load(self, token_key)
+        user.is_active = False
+        user.save()
+        return entry
+
+    monkeypatch.setattr(
+        CachedTokenAuthentication, 'load', load_then_deactivate
+    )
+    client = token_client(key)
+    assert client.get('/api/users/me/').status_code == 200
+    monkeypatch.setattr(CachedTokenAuthentication, 'load', load)
+    assert client.get('/api/users/me/').status_code == 401
+
+
+def test_async_views(user_client):
+    assert user_client.get('/api/async/recipes/').status_code == 200
+    response = token_client('missing').get('/api/async/recipes/')
+    assert response.status_code == 401
+    assert response['WWW-Authenticate'] == 'Token'
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.set('a', 1, 10)
+    cache.set('b', 2, 10)
+    cache.get('a')
+    cache.set('c', 3, 10)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    cache.set('d', 4, -1)
+    assert cache.get('d') is None
@@ -0,0 +1,23 @@
+import pytest
+
+from api.autocomplete import IngredientIndex
+from recipes.models import Ingredient
+
+pytestmark = pytest.mark.django_db
+
+
+def test_index_reloads_after_ttl(settings, ingredients):
+    # bulk_create без сигналов: поколение сбросил бы другой процесс.
+    index = IngredientIndex()
+    assert index.search('новый') == []
+    Ingredient.objects.bulk_create([
+        Ingredient(name='Новый ингредиент', measurement_unit='г')
+    ])
+
+    assert index.search('новый') == []
+    settings.INGREDIENT_AUTOCOMPLETE = {
+        **settings.INGREDIENT_AUTOCOMPLETE, 'INDEX_TTL': 0,
+    }
+    assert [row['name'] for row in index.search('новый')] == [
+        'Новый ингредиент'
+    ]
@@ -0,0 +1,71 @@
+"""ETag списка рецептов меняется вместе с данными на странице."""
+import pytest
+
+from recipes.models import Recipe, RecipeFavorite
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+LOCAL_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@pytest.fixture(params=['local', 'shared'])
+def cache_backend(request, settings):
+    if request.param == 'shared':
+        request.getfixturevalue('shared_cache')
+    else:
+        settings.CACHES = {'default': {'BACKEND': LOCAL_CACHE}}
+    return request.param
+
+
+def rename(recipe, name):
+    recipe = Recipe.objects.get(pk=recipe.pk)
+    recipe.name = name
+    recipe.save()
+
+
+@pytest.mark.parametrize('path', ['/api/recipes/', '/api/async/recipes/'])
+@pytest.mark.parametrize('authenticated', [False, True])
+def test_list_etag(path, authenticated, cache_backend, client, user_client,
+                   user, author, make_recipes):
+    client = user_client if authenticated else client
+
+    def get_list(client, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return client.get(path, **headers)
+
+    recipe, = make_recipes(1)
+    etag = get_list(client)['ETag']
+    assert get_list(client, etag).status_code == 304
+
+    changes = [
+        lambda: rename(recipe, 'Новое название'),
+        lambda: setattr(author, 'last_name', 'Новая') or author.save(),
+    ]
+    if authenticated:
+        # Флаг is_favorited меняется сразу; счетчик избранного в
+        # списке анонимов отстает до RESPONSE_CACHE['TIMEOUT'].
+        changes.append(lambda: RecipeFavorite.objects.create(
+            user=user, favorite_recipe=recipe
+        ))
+    for change in changes:
+        change()
+        response = get_list(client, etag)
+        assert response.status_code == 200
+        etag = response['ETag']
+        assert get_list(client, etag).status_code == 304
+
+
+@pytest.mark.parametrize('path', ['/api/recipes/', '/api/async/recipes/'])
+def test_local_cache_etag_ignores_generations(path, settings, user_client,
+                                              make_recipes):
+    """Изменение в другом процессе не сбрасывает здешние поколения, но
+    ETag по содержимому все равно меняется."""
+    settings.CACHES = {'default': {'BACKEND': LOCAL_CACHE}}
+    recipe, = make_recipes(1)
+    etag = user_client.get(path)['ETag']
+
+    Recipe.objects.filter(pk=recipe.pk).update(name='Изменено в другом')
+
+    response = user_client.get(path, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
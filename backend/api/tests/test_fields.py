@@ -0,0 +1,38 @@
+import base64
+import io
+import os
+
+import pytest
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from api.fields import Base64ImageField
+
+
+def noise_png(size=(200, 200)):
+    # Шум почти не сжимается: base64 длиннее одного куска декодера.
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3)).save(
+        buffer, 'PNG'
+    )
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('encode', [base64.b64encode, base64.encodebytes])
+def test_decode(encode):
+    content = noise_png()
+    encoded = encode(content).decode()
+    assert len(encoded) > Base64ImageField.chunk_size
+    upload = Base64ImageField().to_internal_value(
+        f'data:image/png;base64,{encoded}'
+    )
+    assert upload.read() == content
+    assert upload.size == len(content)
+
+
+def test_decode_truncated():
+    encoded = base64.b64encode(noise_png()).decode()[:-1]
+    with pytest.raises(ValidationError):
+        Base64ImageField().to_internal_value(
+            f'data:image/png;base64,{encoded}'
+        )
@@ -0,0 +1,68 @@
+import pytest
+
+from recipes.models import RecipeFavorite, ShoppingCart
+
+MEMBERSHIP_PARAMS = ['is_favorited', 'is_in_shopping_cart']
+
+
+@pytest.fixture
+def recipes(make_recipes):
+    return make_recipes(3)
+
+
+@pytest.mark.parametrize('param', MEMBERSHIP_PARAMS)
+@pytest.mark.parametrize('pagination', [
+    '', '&pagination=cursor', '&pagination=cursor&count=true',
+])
+def test_membership_filter_empty(param, pagination, client, user_client,
+                                 recipes):
+    # Аноним и пользователь с пустым множеством получают пустую страницу.
+    for api_client in (client, user_client):
+        response = api_client.get(f'/api/recipes/?{param}=1{pagination}')
+        assert response.status_code == 200
+        assert response.json()['results'] == []
+        if 'count=true' in pagination or not pagination:
+            assert response.json()['count'] == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_membership_filter_count(user, user_client, recipes):
+    RecipeFavorite.objects.create(user=user, favorite_recipe=recipes[0])
+    ShoppingCart.objects.create(user=user, recipe_buy=recipes[1])
+    for param, recipe in zip(MEMBERSHIP_PARAMS, recipes):
+        response = user_client.get(
+            f'/api/recipes/?{param}=1&pagination=cursor&count=true'
+        )
+        assert response.json()['count'] == 1
+        assert [item['id'] for item in response.json()['results']] == [
+            recipe.pk
+        ]
+
+
+def test_tags_filter_returns_recipe_once(client, tags, recipes):
+    # make_recipes дает i-му рецепту теги tags[:i + 1].
+    slugs = [tag.slug for tag in tags]
+    response = client.get('/api/recipes/', {'tags': slugs})
+    assert response.status_code == 200
+    ids = [recipe['id'] for recipe in response.json()['results']]
+    assert sorted(ids) == sorted(recipe.pk for recipe in recipes)
+    assert response.json()['count'] == len(recipes)
+
+
+@pytest.mark.parametrize('pagination', [
+    {}, {'pagination': 'cursor', 'count': 'true'},
+])
+def test_tags_filter_count(pagination, client, tags, recipes):
+    response = client.get(
+        '/api/recipes/', {'tags': [tags[1].slug, tags[2].slug], **pagination}
+    )
+    assert response.json()['count'] == 2
+    assert {recipe['id'] for recipe in response.json()['results']} == {
+        recipes[1].pk, recipes[2].pk,
+    }
+
+
+def test_tags_filter_unknown_slug(client, tags, recipes):
+    response = client.get('/api/recipes/', {'tags': 'unknown'})
+    assert response.status_code == 400
+    assert 'tags' in response.json()
@@ -0,0 +1,49 @@
+import pytest
+from rest_framework.authtoken.models import Token
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def profile_all(settings):
+    settings.DEBUG = False
+    settings.INSTRUMENTATION = {
+        **settings.INSTRUMENTATION, 'SAMPLE_RATE': 1.0,
+    }
+
+
+def enable_server_timing(settings, enabled=True):
+    settings.INSTRUMENTATION = {
+        **settings.INSTRUMENTATION, 'SERVER_TIMING': enabled,
+    }
+
+
+@pytest.fixture
+def staff_client(user, client):
+    user.is_staff = True
+    user.save()
+    token = Token.objects.create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.mark.usefixtures('profile_all')
+def test_server_timing_off_by_default(staff_client):
+    assert 'Server-Timing' not in staff_client.get('/api/tags/')
+
+
+@pytest.mark.usefixtures('profile_all')
+def test_server_timing_only_for_staff(settings, client, user_client):
+    enable_server_timing(settings)
+    assert 'Server-Timing' not in client.get('/api/tags/')
+    assert 'Server-Timing' not in user_client.get('/api/tags/')
+
+
+@pytest.mark.usefixtures('profile_all')
+@pytest.mark.parametrize('path', ['/api/recipes/', '/api/async/recipes/'])
+def test_server_timing_for_staff(path, settings, staff_client):
+    enable_server_timing(settings)
+    server_timing = staff_client.get(path)['Server-Timing']
+    assert 'db;dur=' in server_timing
+    # Метрика из foodgram.timing.record_timing.
+    assert 'auth;dur=' in server_timing
@@ -0,0 +1,47 @@
+import pytest
+
+from api import membership
+from recipes.models import RecipeFavorite, ShoppingCart
+
+pytestmark = [
+    pytest.mark.django_db(transaction=True),
+    pytest.mark.usefixtures('shared_cache'),
+]
+
+
+def recipe_flags(client, recipe):
+    data = client.get(f'/api/recipes/{recipe.pk}/').json()
+    return data['is_favorited'], data['is_in_shopping_cart']
+
+
+def test_flags_follow_changes(user, user_client, make_recipes):
+    recipe, = make_recipes(1)
+    assert recipe_flags(user_client, recipe) == (False, False)
+    RecipeFavorite.objects.create(user=user, favorite_recipe=recipe)
+    ShoppingCart.objects.create(user=user, recipe_buy=recipe)
+    assert recipe_flags(user_client, recipe) == (True, True)
+    RecipeFavorite.objects.filter(user=user).delete()
+    assert recipe_flags(user_client, recipe) == (False, True)
+
+
+def test_change_during_load_is_not_cached(user, make_recipes, monkeypatch):
+    # Избранное коммитится, пока запрос читает старое множество из БД.
+    recipe, = make_recipes(1)
+    load = membership.load
+
+    def load_then_favorite(user_id, kind):
+        members = load(user_id, kind)
+        RecipeFavorite.objects.create(user=user, favorite_recipe=recipe)
+        return members
+
+    monkeypatch.setattr(membership, 'load', load_then_favorite)
+    assert recipe.pk not in membership.Membership(user.pk).favorites
+    monkeypatch.setattr(membership, 'load', load)
+    assert recipe.pk in membership.Membership(user.pk).favorites
+
+
+def test_disabled_with_local_cache(settings):
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }}
+    assert not membership.is_enabled()
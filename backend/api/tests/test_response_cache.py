@@ -0,0 +1,40 @@
+"""Кэш анонимных ответов сбрасывается при изменении данных в них."""
+import pytest
+from django.core.cache import cache
+
+from api.cache import RECIPES_GENERATION, get_generation
+from recipes.models import RecipeFavorite
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+def anonymous_recipe(client, recipe):
+    list_data = client.get('/api/recipes/').json()['results'][0]
+    detail_data = client.get(f'/api/recipes/{recipe.pk}/').json()
+    assert list_data == detail_data
+    return list_data
+
+
+def test_favorite_keeps_cached_list(client, user, make_recipes):
+    recipe, = make_recipes(1)
+    generation = get_generation(RECIPES_GENERATION)
+    assert anonymous_recipe(client, recipe)['favorites_count'] == 0
+
+    RecipeFavorite.objects.create(user=user, favorite_recipe=recipe)
+    assert get_generation(RECIPES_GENERATION) == generation
+    detail_data = client.get(f'/api/recipes/{recipe.pk}/').json()
+    assert detail_data['favorites_count'] == 1
+    list_data = client.get('/api/recipes/').json()['results'][0]
+    assert list_data['favorites_count'] == 0
+
+    # Запись списка устарела по TIMEOUT.
+    cache.clear()
+    assert anonymous_recipe(client, recipe)['favorites_count'] == 1
+
+
+def test_author_change_updates_cached_list(client, author, make_recipes):
+    recipe, = make_recipes(1)
+    anonymous_recipe(client, recipe)
+    author.first_name = 'Новое'
+    author.save()
+    assert anonymous_recipe(client, recipe)['author']['first_name'] == 'Новое'
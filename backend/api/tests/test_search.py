@@ -0,0 +1,82 @@
+"""Поиск рецептов без PostgreSQL: подстрока, выше совпадения в названии."""
+import pytest
+
+from recipes.models import Ingredient, Recipe, RecipeFavorite, RecipeIngredient
+
+QUERY = 'гриб'
+
+
+@pytest.fixture
+def recipes(author, tags, ingredients):
+    # Порядок создания — от старых к новым; новые идут первыми.
+    mushrooms = Ingredient.objects.create(name='грибы', measurement_unit='г')
+
+    def create(name, text='Текст', tag=tags[0], ingredient=ingredients[0]):
+        recipe = Recipe.objects.create(
+            author=author, name=name, text=text, cooking_time=10,
+            image='recipes/image.png',
+        )
+        recipe.tags.set([tag])
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=100,
+        )
+        return recipe
+
+    return {
+        'name': create('Суп грибной', tag=tags[1]),
+        'text': create('Каша', text='С лесными грибами'),
+        'ingredient': create('Жаркое', ingredient=mushrooms),
+        'other': create('Компот'),
+    }
+
+
+def result_ids(response):
+    assert response.status_code == 200
+    return [recipe['id'] for recipe in response.json()['results']]
+
+
+def test_name_match_ranked_first(client, recipes):
+    response = client.get('/api/recipes/', {'search': QUERY})
+    assert result_ids(response) == [
+        recipes['name'].pk, recipes['ingredient'].pk, recipes['text'].pk,
+    ]
+
+
+def test_search_with_tags(client, tags, recipes):
+    response = client.get(
+        '/api/recipes/', {'search': QUERY, 'tags': tags[0].slug}
+    )
+    assert result_ids(response) == [
+        recipes['ingredient'].pk, recipes['text'].pk,
+    ]
+
+
+def test_search_with_is_favorited(user, user_client, recipes):
+    RecipeFavorite.objects.create(user=user, favorite_recipe=recipes['text'])
+    RecipeFavorite.objects.create(user=user, favorite_recipe=recipes['other'])
+    response = user_client.get(
+        '/api/recipes/', {'search': QUERY, 'is_favorited': 1}
+    )
+    assert result_ids(response) == [recipes['text'].pk]
+
+
+@pytest.mark.parametrize('query', ['', '  '])
+def test_empty_query_returns_all(query, client, recipes):
+    response = client.get('/api/recipes/', {'search': query})
+    assert result_ids(response) == [
+        recipe.pk for recipe in reversed(list(recipes.values()))
+    ]
+
+
+def test_search_forces_page_number_pagination(client, recipes):
+    # Курсор сортирует по дате и сбил бы порядок по релевантности.
+    response = client.get('/api/recipes/', {
+        'search': QUERY, 'pagination': 'cursor', 'limit': 2,
+    })
+    assert result_ids(response) == [
+        recipes['name'].pk, recipes['ingredient'].pk,
+    ]
+    data = response.json()
+    assert data['count'] == 3
+    assert 'page=2' in data['next']
+    assert result_ids(client.get(data['next'])) == [recipes['text'].pk]
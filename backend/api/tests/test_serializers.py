@@ -0,0 +1,68 @@
+"""RecipeReadSerializer с ORJSONRenderer отдает те же байты, что
+RecipeGetSerializer с JSONRenderer DRF."""
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.renderers import ORJSONRenderer
+from api.serializers import RecipeGetSerializer, RecipeReadSerializer
+from recipes.models import Recipe, RecipeFavorite, ShoppingCart
+from users.models import Subscription
+
+
+@pytest.fixture
+def recipes(make_recipes):
+    recipes = make_recipes(3)
+    # Разделители строк, которые оба рендерера экранируют для JS.
+    recipes[0].text = 'Строка\u2028абзац\u2029конец'
+    recipes[0].save()
+    recipes[1].image = ''
+    recipes[1].save()
+    return recipes
+
+
+def make_request(user):
+    request = Request(APIRequestFactory().get('/api/recipes/'))
+    request.user = user
+    return request
+
+
+def render_both(queryset, user):
+    page = list(queryset)
+    context = {'request': make_request(user)}
+    expected = JSONRenderer().render(
+        RecipeGetSerializer(page, many=True, context=context).data
+    )
+    # Новый запрос: множества пользователя кэшируются в нем.
+    context = {'request': make_request(user)}
+    actual = ORJSONRenderer().render(
+        RecipeReadSerializer(page, many=True, context=context).data
+    )
+    return expected, actual
+
+
+def test_anonymous(recipes):
+    expected, actual = render_both(
+        Recipe.objects.with_related(), AnonymousUser()
+    )
+    assert actual == expected
+    assert b'\\u2028' in actual and b'\\u2029' in actual
+    assert b'"image":null' in actual
+
+
+@pytest.mark.parametrize('annotated', [False, True])
+def test_user_flags(annotated, user, author, recipes):
+    RecipeFavorite.objects.create(user=user, favorite_recipe=recipes[0])
+    ShoppingCart.objects.create(user=user, recipe_buy=recipes[2])
+    Subscription.objects.create(user=user, author=author)
+    queryset = Recipe.objects.with_related()
+    if annotated:
+        queryset = queryset.with_user_flags(user)
+
+    expected, actual = render_both(queryset, user)
+    assert actual == expected
+    assert b'"is_favorited":true' in actual
+    assert b'"is_in_shopping_cart":true' in actual
+    assert b'"is_subscribed":true' in actual
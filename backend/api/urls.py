@@ -1,10 +1,13 @@
-from django.urls import include, path
+from django.conf import settings
+from django.urls import include, path, re_path
 from rest_framework import routers
 
+from api import async_views
 from api.views import (FavoriteViewSet, IngredientsViewSet, RecipesViewSet,
                        ShoppingCartViewSet, TagsViewSet)
 
-from .views import SubscribeViewSet, SubscriptionView
+from .views import (SubscribeViewSet, SubscriptionView, TokenCreateView,
+                    TokenRotateView)
 
 router = routers.DefaultRouter()
 
@@ -12,11 +15,22 @@ router.register(r'recipes', RecipesViewSet)
 router.register(r'tags', TagsViewSet)
 router.register(r'ingredients', IngredientsViewSet)
 
+async_urlpatterns = [
+    path('recipes/', async_views.recipes_list),
+    path('recipes/<int:pk>/', async_views.recipe_detail),
+    path('tags/', async_views.tags_list),
+    path('ingredients/', async_views.ingredients_list),
+    path('users/subscriptions/', async_views.subscriptions_list),
+]
+
 urlpatterns = [
     path('users/subscriptions/', SubscriptionView.as_view()),
     path('recipes/download_shopping_cart/',
          ShoppingCartViewSet.as_view({'get': 'download_shopping_cart'}),
          name='download_shopping_cart'),
+    path('recipes/shopping_list/',
+         ShoppingCartViewSet.as_view({'get': 'shopping_list'}),
+         name='shopping_list'),
     path('recipes/<int:pk>/shopping_cart/',
          ShoppingCartViewSet.as_view({
              'post': 'shopping_cart',
@@ -24,6 +38,10 @@ urlpatterns = [
          }), ),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
+    re_path(r'^auth/token/login/?$', TokenCreateView.as_view(),
+            name='login'),
+    path('auth/token/rotate/', TokenRotateView.as_view(),
+         name='token_rotate'),
     path('auth/', include('djoser.urls.authtoken')),
     path('users/<int:pk>/subscribe/', SubscribeViewSet.as_view({
         'post': 'subscribe',
@@ -35,3 +53,6 @@ urlpatterns = [
               'delete': 'delete_favorite'
               })),
 ]
+
+if settings.ASYNC_API_ENABLED:
+    urlpatterns.append(path('async/', include(async_urlpatterns)))
@@ -1,40 +1,74 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Prefetch, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, status
+from djoser import views as djoser_views
+from djoser.serializers import TokenSerializer
+from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
-from api.filters import RecipeFilter
+from api import membership
+from api.authentication import delete_expired_token
+from api.autocomplete import INGREDIENTS_GENERATION, ingredient_index
+from api.cache import (RECIPES_GENERATION, TAGS_GENERATION,
+                       AnonymousResponseCacheMixin, ConditionalGetMixin,
+                       recipe_generation, recipes_response_cache)
+from api.filters import IngredientSearchFilter, RecipeFilter
+from api.renderers import (ShoppingListContentNegotiation,
+                           ShoppingListCSVRenderer, ShoppingListPDFRenderer,
+                           ShoppingListTextRenderer)
 from api.serializers import (FavoriteDeleteSerializer, FavoriteSerializer,
-                             IngredientsSerializer, RecipeGetSerializer,
+                             IngredientsSerializer,
                              RecipePostPatchDelSerializer,
-                             ShoppingChartSerializer, TagSerializer)
-from recipes.models import (Ingredient, Recipe, RecipeFavorite,
-                            RecipeIngredient, ShoppingCart, Tag)
+                             RecipeReadSerializer, ShoppingChartSerializer,
+                             ShoppingListItemSerializer, TagSerializer)
+from api.shopping_list import get_shopping_list, get_shopping_list_etag
+from recipes.models import (Ingredient, Recipe, RecipeFavorite, ShoppingCart,
+                            ShoppingListItem, Tag)
 from recipes.pagination import RecipesResultsPagination
 from recipes.permissions import IsOwnerOrReadOnly
 from users.models import Subscription, User
 
-from .serializers import SubscribeSerializer, SubscriptionSerializer
+from .serializers import (SubscribeSerializer, SubscriptionSerializer,
+                          get_recipes_limit)
 
 
 class SubscriptionView(ListAPIView):
     permission_classes = (IsAuthenticated,)
 
+    def get_queryset(self):
+        recipes_limit = get_recipes_limit(self.request)
+        return (
+            User.objects
+            .filter(subscribing__user=self.request.user)
+            .annotate(is_subscribed=Value(True))
+            .prefetch_related(Prefetch(
+                'recipes',
+                queryset=Recipe.objects.latest_per_author(recipes_limit),
+                to_attr='latest_recipes',
+            ))
+        )
+
     def get(self, request):
-        user = request.user
-        authors = User.objects.filter(subscribing__user=user)
-        object = self.paginate_queryset(authors)
+        recipes_limit = get_recipes_limit(request)
+        object = self.paginate_queryset(self.get_queryset())
         serializer = SubscriptionSerializer(
             object,
             many=True,
-            context={'request': request}
+            context={'request': request, 'recipes_limit': recipes_limit}
         )
 
         return self.get_paginated_response(serializer.data)
@@ -53,7 +87,10 @@ class SubscribeViewSet(ModelViewSet):
             'author': pk,
             'user': user.pk,
         }
-        serializer = SubscribeSerializer(data=data)
+        serializer = SubscribeSerializer(data=data, context={
+            'request': request,
+            'recipes_limit': get_recipes_limit(request),
+        })
         serializer.is_valid(raise_exception=True)
         serializer.save()
 
@@ -67,23 +104,110 @@ class SubscribeViewSet(ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class RecipesViewSet(ModelViewSet):
+class TokenCreateView(djoser_views.TokenCreateView):
+    """Вход: истекший токен заменяется новым, а не выдается повторно."""
+
+    def _action(self, serializer):
+        delete_expired_token(serializer.user)
+        return super()._action(serializer)
+
+
+class TokenRotateView(APIView):
+    """Выдает новый токен вместо текущего, старый перестает работать."""
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        with transaction.atomic():
+            Token.objects.filter(user=request.user).delete()
+            token = Token.objects.create(user=request.user)
+        return Response(TokenSerializer(token).data)
+
+
+class RecipesViewSet(
+    ConditionalGetMixin, AnonymousResponseCacheMixin, ModelViewSet
+):
     queryset = Recipe.objects.all()
+    response_cache = recipes_response_cache
+    etag_per_user = True
     permission_classes = [IsOwnerOrReadOnly, ]
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = RecipesResultsPagination
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve', 'popular'):
+            return queryset
+        queryset = queryset.with_related()
+        if membership.is_enabled():
+            # Флаги берет сериализатор из множеств пользователя в кэше.
+            return queryset
+        return queryset.with_user_flags(self.request.user)
+
     def get_serializer_class(self):
-        if self.action == 'list' or self.action == 'retrieve':
-            return RecipeGetSerializer
+        if self.action in ('list', 'retrieve', 'popular'):
+            return RecipeReadSerializer
 
         return RecipePostPatchDelSerializer
 
+    def get_etag_max_age(self):
+        # Счетчики избранного в списке не сбрасывают общее поколение и
+        # обновляются вместе с кэшем ответов.
+        if self.action == 'list':
+            return settings.RESPONSE_CACHE['TIMEOUT']
+        return None
+
+    def get_etag_generations(self):
+        # Общее поколение сбрасывают изменения рецептов и авторов.
+        names = [RECIPES_GENERATION, *super().get_etag_generations()]
+        if self.action == 'retrieve':
+            names.append(recipe_generation(self.kwargs['pk']))
+        return names
+
+    def get_cache_generations(self):
+        if self.action == 'retrieve':
+            return (recipe_generation(self.kwargs['pk']),)
+        return ()
+
+    @action(detail=False)
+    def popular(self, request):
+        # Порядок по рейтингу и id задает пагинация по ключу.
+        queryset = self.filter_queryset(
+            self.get_queryset()
+            .filter(popularity__isnull=False)
+            .annotate(popularity_score=F('popularity__score'))
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
 
 class ShoppingCartViewSet(ModelViewSet):
     # queryset = ShoppingCart.objects.all()
     permission_classes = [IsAuthenticated]
+    download_renderer_classes = (
+        ShoppingListTextRenderer,
+        ShoppingListCSVRenderer,
+        ShoppingListPDFRenderer,
+    )
+
+    def get_renderers(self):
+        if getattr(self, 'action', None) == 'download_shopping_cart':
+            return [renderer() for renderer in self.download_renderer_classes]
+        return super().get_renderers()
+
+    def get_content_negotiator(self):
+        if getattr(self, 'action', None) == 'download_shopping_cart':
+            return ShoppingListContentNegotiation()
+        return super().get_content_negotiator()
+
+    def handle_exception(self, exc):
+        response = super().handle_exception(exc)
+        if getattr(self, 'action', None) == 'download_shopping_cart':
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return response
 
     def get_queryset(self):
         current_user = self.request.user
@@ -104,10 +228,12 @@ class ShoppingCartViewSet(ModelViewSet):
                     user=user,
             ).exists():
                 raise ValidationError('Рецепт уже в списке покупок.')
-            ShoppingCart.objects.create(
-                recipe_buy=recipe,
-                user=user,
-            )
+            # Строка корзины и список покупок сохраняются вместе.
+            with transaction.atomic():
+                ShoppingCart.objects.create(
+                    recipe_buy=recipe,
+                    user=user,
+                )
             serializer = ShoppingChartSerializer(recipe)
 
             return Response(
@@ -124,49 +250,86 @@ class ShoppingCartViewSet(ModelViewSet):
 
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def download_shopping_cart(self, request):
-        ingredient_list = {}
-        data = ['Ваш список покупок: ']
-        i = 1
-        ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe__shopping_cart__user=request.user)
-            .values_list('ingredient__name', 'ingredient__measurement_unit')
-            .annotate(amount=Sum('amount'))
+    def shopping_list(self, request):
+        items = (
+            ShoppingListItem.objects
+            .filter(user=request.user)
+            .select_related('ingredient')
+            .order_by('ingredient__name', 'ingredient__measurement_unit')
         )
+        data = ShoppingListItemSerializer(items, many=True).data
+        etag = quote_etag(get_shopping_list_etag(
+            (tuple(item.values()) for item in data), 'json'
+        ))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        return Response(data, headers={'ETag': etag})
 
-        for ingredient in ingredients:
-            name = ingredient[0]
-            amount = ingredient[2]
-            measure = ingredient[1]
-            if name not in ingredient_list:
-                ingredient_list[name] = [measure, amount]
-            else:
-                ingredient_list[name][1] += amount
-                print(ingredient_list[name][1])
-
-        for key, value in ingredient_list.items():
-            result = f'\n{i} - {key}({value[0]}) - {value[1]} '
-            data.append(result)
-            i += 1
-
-        return HttpResponse(data, content_type='application')
+    def download_shopping_cart(self, request):
+        renderer = request.accepted_renderer
+        rows = get_shopping_list(request.user)
+        etag = get_shopping_list_etag(rows, renderer.format)
+        not_modified = get_conditional_response(request, etag=quote_etag(etag))
+        if not_modified is not None:
+            return not_modified
+
+        response = StreamingHttpResponse(
+            renderer.stream(rows),
+            content_type=(
+                f'{renderer.media_type}; charset={renderer.charset}'
+                if renderer.charset else renderer.media_type
+            ),
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.extension}"'
+        )
+        response['ETag'] = quote_etag(etag)
+        return response
 
 
-class TagsViewSet(ModelViewSet):
+class TagsViewSet(ConditionalGetMixin, ModelViewSet):
     queryset = Tag.objects.all()
+    etag_generations = (TAGS_GENERATION,)
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = [AllowAny]
 
 
-class IngredientsViewSet(ModelViewSet):
+class IngredientsViewSet(ConditionalGetMixin, ModelViewSet):
     queryset = Ingredient.objects.all()
+    etag_generations = (INGREDIENTS_GENERATION,)
     serializer_class = IngredientsSerializer
-    filter_backends = (filters.SearchFilter,)
+    filter_backends = (IngredientSearchFilter,)
     pagination_class = None
     permission_classes = [AllowAny]
-    search_fields = ('^name',)
+
+    def get_search_limit(self):
+        limit = settings.INGREDIENT_AUTOCOMPLETE['LIMIT']
+        try:
+            requested = int(self.request.query_params['limit'])
+        except (KeyError, ValueError):
+            return limit
+        if requested > 0:
+            return min(requested, limit) if limit else requested
+        return limit
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.query_params.get(api_settings.SEARCH_PARAM):
+            return queryset[:self.get_search_limit()]
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get(api_settings.SEARCH_PARAM)
+        if query and settings.INGREDIENT_AUTOCOMPLETE['INDEX_ENABLED']:
+            return self.conditional_response(self.search_index, request, query)
+        return super().list(request, *args, **kwargs)
+
+    def search_index(self, request, query):
+        return Response(
+            ingredient_index.search(query, self.get_search_limit())
+        )
 
 
 class FavoriteViewSet(ModelViewSet):
@@ -0,0 +1,94 @@
+import pytest
+from django.core.cache import cache
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+PASSWORD = 'Pa55word!'
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def shared_cache(settings, tmp_path):
+    """Общий для процессов кэш: с ним включаются поколения в ETag и
+    множества пользователя в кэше."""
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path / 'cache'),
+        },
+    }
+
+
+def create_user(username):
+    return User.objects.create_user(
+        email=f'{username}@example.com',
+        username=username,
+        first_name=username,
+        last_name=username,
+        password=PASSWORD,
+    )
+
+
+@pytest.fixture
+def user(db):
+    return create_user('user')
+
+
+@pytest.fixture
+def author(db):
+    return create_user('author')
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    token = Token.objects.create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}', slug=f'tag{i}')
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(name=f'Ингредиент {i}', measurement_unit='г')
+        for i in range(5)
+    ]
+
+
+@pytest.fixture
+def make_recipes(author, tags, ingredients):
+    def make(count, author=author):
+        recipes = []
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {i}', text='Текст',
+                cooking_time=10, image='recipes/image.png',
+            )
+            recipe.tags.set(tags[:i % len(tags) + 1])
+            for ingredient in ingredients[:3]:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=100,
+                )
+            recipes.append(recipe)
+        return recipes
+    return make
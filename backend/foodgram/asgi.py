@@ -10,7 +10,18 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.core.exceptions import ImproperlyConfigured
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_asgi_application()
+
+from api.cache import is_shared_cache  # noqa: E402
+
+# ASGI-сервис работает рядом с WSGI: с кэшем в памяти процесса сбросы
+# поколений и множеств пользователей не доходили бы из одного в другой.
+if not is_shared_cache():
+    raise ImproperlyConfigured(
+        'Для ASGI-сервиса нужен общий кэш: задайте CACHE_BACKEND '
+        '(Redis или Memcached).'
+    )
@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram.db.router import read_from
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """Безопасные запросы читают с реплики, остальные — с основной БД.
+
+    После записи клиент еще DB_PRIMARY_STICKY_SECONDS читает с основной
+    БД и видит свои изменения, даже если реплика отстает. Клиент
+    узнается по cookie и по заголовку Authorization: между воркерами
+    отметка по заголовку видна только при общем кэше.
+    """
+
+    cookie_name = 'primary_db_until'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with read_from(self.choose_replica(request)):
+            response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        with read_from(self.choose_replica(request)):
+            response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def choose_replica(self, request):
+        if (
+            not settings.DATABASE_REPLICAS
+            or request.method not in SAFE_METHODS
+            or self.is_sticky(request)
+        ):
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def is_sticky(self, request):
+        try:
+            until = float(request.COOKIES.get(self.cookie_name, 0))
+        except ValueError:
+            until = 0
+        if until > time.time():
+            return True
+        key = self.get_marker_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def process_response(self, request, response):
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            sticky = settings.DB_PRIMARY_STICKY_SECONDS
+            response.set_cookie(
+                self.cookie_name,
+                str(time.time() + sticky),
+                max_age=sticky,
+                httponly=True,
+                samesite='Lax',
+            )
+            key = self.get_marker_key(request)
+            if key is not None:
+                cache.set(key, True, sticky)
+        return response
+
+    def get_marker_key(self, request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        digest = hashlib.md5(authorization.encode()).hexdigest()
+        return f'db:primary:{digest}'
@@ -0,0 +1,113 @@
+"""Пул соединений с БД внутри процесса.
+
+Размер пула задается на процесс: у gunicorn с N воркерами к базе
+открыто не больше N * MAX_SIZE соединений.
+"""
+import threading
+import time
+
+from psycopg2 import OperationalError, extensions
+
+
+class PoolTimeout(OperationalError):
+    """Свободное соединение не появилось за отведенное время."""
+
+
+class ConnectionPool:
+
+    def __init__(self, max_size, timeout, max_lifetime=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle = []
+        self.created = {}
+        self.condition = threading.Condition()
+
+    @property
+    def size(self):
+        return len(self.created)
+
+    def get(self, connect, check=None):
+        """Свободное соединение или новое через connect().
+
+        Свободное соединение, не прошедшее check, закрывается. Возвращает
+        пару (соединение, время ожидания в секундах).
+        """
+        started = time.monotonic()
+        while True:
+            connection, slot = self._checkout(started + self.timeout)
+            if connection is None:
+                break
+            if check is None or check(connection):
+                return connection, time.monotonic() - started
+            self.discard(connection)
+        try:
+            connection = connect()
+        except Exception:
+            self._forget(slot)
+            raise
+        with self.condition:
+            del self.created[slot]
+            self.created[connection] = time.monotonic()
+        return connection, time.monotonic() - started
+
+    def _checkout(self, deadline):
+        """Пара (свободное соединение, None) или (None, место под новое)."""
+        with self.condition:
+            while not self.idle and self.size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.condition.wait(remaining):
+                    raise PoolTimeout(
+                        f'Нет свободного соединения с БД за {self.timeout} с '
+                        f'(в пуле {self.max_size}).'
+                    )
+            if self.idle:
+                return self.idle.pop(), None
+            # Место занимается до подключения, чтобы соседние потоки не
+            # превысили max_size, пока идет connect().
+            slot = object()
+            self.created[slot] = None
+            return None, slot
+
+    def put(self, connection):
+        """Возвращает соединение в пул или закрывает негодное."""
+        if connection.closed or self._expired(connection):
+            self.discard(connection)
+            return
+        status = connection.info.transaction_status
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            self.discard(connection)
+            return
+        if status != extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+        with self.condition:
+            self.idle.append(connection)
+            self.condition.notify()
+
+    def discard(self, connection):
+        if not connection.closed:
+            connection.close()
+        self._forget(connection)
+
+    def age(self, connection):
+        created = self.created.get(connection)
+        return None if created is None else time.monotonic() - created
+
+    def stats(self):
+        with self.condition:
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'max_size': self.max_size,
+            }
+
+    def _expired(self, connection):
+        if self.max_lifetime is None:
+            return False
+        age = self.age(connection)
+        return age is not None and age >= self.max_lifetime
+
+    def _forget(self, connection):
+        with self.condition:
+            self.created.pop(connection, None)
+            self.condition.notify()
@@ -0,0 +1,118 @@
+"""PostgreSQL с проверкой постоянных соединений и пулом в процессе.
+
+Настройки в DATABASES:
+    CONN_HEALTH_CHECKS — перед первым запросом к БД в обработке запроса
+        переиспользуемое соединение проверяется через SELECT 1;
+    POOL — {'ENABLED', 'MAX_SIZE', 'TIMEOUT', 'MAX_LIFETIME'}: закрытое
+        Django соединение возвращается в пул, а не рвется.
+
+Время подключения, ожидание пула и возраст соединения попадают в
+Server-Timing профилируемых запросов.
+"""
+import threading
+import time
+
+from django.db.backends.postgresql import base
+
+from foodgram.db.pool import ConnectionPool
+from foodgram.timing import record_timing
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, config):
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(
+                max_size=config['MAX_SIZE'],
+                timeout=config['TIMEOUT'],
+                max_lifetime=config.get('MAX_LIFETIME'),
+            )
+        return _pools[alias]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connected_at = None
+        self.checked_in_request = False
+
+    @property
+    def pool(self):
+        config = self.settings_dict.get('POOL') or {}
+        if not config.get('ENABLED'):
+            return None
+        return get_pool(self.alias, config)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection, wait = pool.get(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            ),
+            check=(
+                self.check_pooled
+                if self.settings_dict.get('CONN_HEALTH_CHECKS') else None
+            ),
+        )
+        stats = pool.stats()
+        record_timing(
+            'db-pool', wait,
+            f'{stats["size"] - stats["idle"]}/{stats["max_size"]} busy',
+        )
+        self.record_age(pool.age(connection))
+        return connection
+
+    def check_pooled(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        self.connected_at = time.monotonic()
+        self.checked_in_request = True
+        record_timing('db-connect', time.perf_counter() - started)
+
+    def _cursor(self, name=None):
+        self.check_connection()
+        return super()._cursor(name)
+
+    def check_connection(self):
+        """Первый запрос к БД в обработке запроса: проверка соединения,
+        если она включена, и возраст соединения в метриках."""
+        if self.connection is None or self.checked_in_request:
+            return
+        self.checked_in_request = True
+        if (
+            self.settings_dict.get('CONN_HEALTH_CHECKS')
+            and not self.in_atomic_block
+            and not self.is_usable()
+        ):
+            self.close()
+            return
+        self.record_age(time.monotonic() - self.connected_at)
+
+    def record_age(self, age):
+        if age is not None:
+            record_timing('db-conn', 0, f'age {age:.0f}s')
+
+    def close_if_unusable_or_obsolete(self):
+        # Вызывается в начале и в конце каждого запроса.
+        self.checked_in_request = False
+        super().close_if_unusable_or_obsolete()
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.put(self.connection)
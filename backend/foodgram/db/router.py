@@ -0,0 +1,37 @@
+"""Чтение с реплики для безопасных запросов, запись — в основную БД.
+
+Реплику на время запроса выбирает ReplicaRoutingMiddleware. Вне
+запросов (команды, фоновые задачи) все идет в основную БД.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+@contextmanager
+def read_from(alias):
+    """Чтение из alias внутри блока; None — из основной БД."""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
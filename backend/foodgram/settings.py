@@ -40,6 +40,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.QueryInstrumentationMiddleware',
+    'foodgram.db.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,17 +81,98 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 #     }
 # }
 
+DB_POOL_ENABLED = os.getenv('DB_POOL_ENABLED', 'False') == 'True'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'foodgram.db.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # С пулом Django отдает соединение в пул в конце каждого запроса.
+        'CONN_MAX_AGE': (
+            0 if DB_POOL_ENABLED
+            else int(os.getenv('DB_CONN_MAX_AGE', 60))
+        ),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+        ),
+        'POOL': {
+            'ENABLED': DB_POOL_ENABLED,
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'MAX_LIFETIME': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+        },
+    }
+}
+
+# Реплики для чтения: DB_REPLICA_HOSTS="replica1 replica2:5433".
+DATABASE_REPLICAS = []
+for index, replica in enumerate(os.getenv('DB_REPLICA_HOSTS', '').split()):
+    host, _, port = replica.partition(':')
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['foodgram.db.router.ReplicaRouter']
+
+DB_PRIMARY_STICKY_SECONDS = int(os.getenv('DB_PRIMARY_STICKY_SECONDS', 5))
+
+# LocMemCache у каждого процесса свой. ETag из поколений данных
+# включаются только с общим кэшем (Redis, Memcached): с LocMemCache
+# ETag считается по телу ответа, иначе процесс, не видевший изменения,
+# отвечал бы 304 на устаревшие данные.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 1000)),
+        },
     }
 }
 
+RESPONSE_CACHE = {
+    'ENABLED': os.getenv('RESPONSE_CACHE_ENABLED', 'True') == 'True',
+    'ALIAS': 'default',
+    'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300)),
+}
+
+# Избранное, корзина и подписки пользователя для флагов в ответах.
+# Работает только с общим кэшем (CACHE_BACKEND): с LocMemCache флаги
+# считаются в запросе страницы.
+MEMBERSHIP_CACHE = {
+    'ENABLED': os.getenv('MEMBERSHIP_CACHE_ENABLED', 'True') == 'True',
+    'TIMEOUT': int(os.getenv('MEMBERSHIP_CACHE_TIMEOUT', 600)),
+}
+
+# Эндпоинты /api/async/ для отдельного ASGI-сервиса
+# (infra/docker-compose.async.yml). В замерах они не быстрее
+# синхронных, поэтому по умолчанию выключены. ASGI-сервис работает
+# вторым процессом рядом с gunicorn и требует общий кэш.
+ASYNC_API_ENABLED = os.getenv('ASYNC_API_ENABLED', 'False') == 'True'
+
+# Пользователи по ключу токена: LRU в памяти процесса и, при
+# SHARED_CACHE, общий кэш. EXPIRES_AFTER — срок жизни токена в
+# секундах, 0 — бессрочно.
+TOKEN_AUTH = {
+    'CACHE_ENABLED': os.getenv('TOKEN_AUTH_CACHE_ENABLED', 'True') == 'True',
+    'LOCAL_TIMEOUT': int(os.getenv('TOKEN_AUTH_LOCAL_TIMEOUT', 10)),
+    'LOCAL_MAX_SIZE': int(os.getenv('TOKEN_AUTH_LOCAL_MAX_SIZE', 10000)),
+    'SHARED_CACHE': os.getenv('TOKEN_AUTH_SHARED_CACHE', 'False') == 'True',
+    'SHARED_TIMEOUT': int(os.getenv('TOKEN_AUTH_SHARED_TIMEOUT', 300)),
+    'EXPIRES_AFTER': int(os.getenv('TOKEN_EXPIRES_AFTER', 0)),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -130,6 +213,34 @@ STATIC_ROOT = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/app/media'
 
+INGREDIENT_AUTOCOMPLETE = {
+    'INDEX_ENABLED': os.getenv('INGREDIENT_INDEX_ENABLED', 'True') == 'True',
+    'LIMIT': int(os.getenv('INGREDIENT_AUTOCOMPLETE_LIMIT', 50)) or None,
+    # Индекс в памяти процесса перечитывается не реже раза в INDEX_TTL
+    # секунд, даже если поколение ingredients не менялось.
+    'INDEX_TTL': int(os.getenv('INGREDIENT_INDEX_TTL', 300)),
+}
+
+RECIPE_IMAGE_LIMITS = {
+    'MAX_BYTES': int(os.getenv('RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024)),
+    'MAX_PIXELS': int(os.getenv('RECIPE_IMAGE_MAX_PIXELS', 40_000_000)),
+}
+
+RECIPE_IMAGE_RENDITIONS = {
+    'WIDTHS': [
+        int(width) for width in
+        os.getenv('RECIPE_IMAGE_WIDTHS', '320 640 1200').split()
+    ],
+    'FORMATS': os.getenv('RECIPE_IMAGE_FORMATS', 'webp jpeg').split(),
+    # False — копии создает только команда generate_image_renditions.
+    'INLINE': os.getenv('RECIPE_IMAGE_RENDITIONS_INLINE', 'True') == 'True',
+}
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -141,17 +252,51 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
 
-    'DEFAULT_PAGINATION_CLASS': 'recipes.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'recipes.pagination.DefaultResultsPagination',
     'PAGE_SIZE': 6,
     'SEARCH_PARAM': 'name'
 }
 
+INSTRUMENTATION = {
+    'ENABLED': os.getenv('INSTRUMENTATION_ENABLED', 'True') == 'True',
+    'SAMPLE_RATE': float(os.getenv('INSTRUMENTATION_SAMPLE_RATE', 0.1)),
+    'SLOW_REQUEST_MS': float(os.getenv('SLOW_REQUEST_MS', 500)),
+    'DUPLICATE_THRESHOLD': int(os.getenv('DUPLICATE_QUERY_THRESHOLD', 3)),
+    # Заголовок Server-Timing — только в режиме DEBUG и персоналу.
+    'SERVER_TIMING': os.getenv('SERVER_TIMING_ENABLED', 'False') == 'True',
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'foodgram.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERFORMANCE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 60)
+)
+
 DJOSER = {
     'SERIALIZERS': {
         'user': 'api.serializers.CustomUserSerializer',
@@ -0,0 +1,24 @@
+"""Настройки для pytest: SQLite вместо PostgreSQL."""
+import tempfile
+
+from foodgram.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',  # noqa: F405
+    },
+    # Реплика включается в тестах через settings.DATABASE_REPLICAS.
+    'replica_0': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',  # noqa: F405
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_REPLICAS = []
+
+ASYNC_API_ENABLED = True
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-media-')
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -0,0 +1,105 @@
+import time
+
+import pytest
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+from foodgram.db.middleware import ReplicaRoutingMiddleware
+from foodgram.db.router import read_from
+from recipes.models import Recipe, ShoppingCart, ShoppingListItem
+
+pytestmark = pytest.mark.django_db(
+    databases=['default', 'replica_0'], transaction=True,
+)
+
+STICKY_SECONDS = 1
+
+
+@pytest.fixture(autouse=True)
+def replicas(settings):
+    settings.DATABASE_REPLICAS = ['replica_0']
+    settings.DB_PRIMARY_STICKY_SECONDS = STICKY_SECONDS
+    settings.RESPONSE_CACHE = {**settings.RESPONSE_CACHE, 'ENABLED': False}
+
+
+def count_queries(request):
+    """Число запросов к основной БД и к реплике во время request()."""
+    with CaptureQueriesContext(connections['default']) as primary, \
+            CaptureQueriesContext(connections['replica_0']) as replica:
+        response = request()
+    return response, len(primary), len(replica)
+
+
+def test_safe_methods_read_replica(client, user_client, make_recipes):
+    make_recipes(3)
+    for api_client in (client, user_client):
+        response, primary, replica = count_queries(
+            lambda: api_client.get('/api/recipes/')
+        )
+        assert response.json()['count'] == 3
+        assert primary == 0
+        assert replica > 0
+
+
+def test_writes_and_sticky_window_use_primary(user_client, make_recipes):
+    recipe, = make_recipes(1)
+    response, _, replica = count_queries(
+        lambda: user_client.post(f'/api/recipes/{recipe.pk}/favorite/')
+    )
+    assert response.status_code == 201
+    assert replica == 0
+    assert ReplicaRoutingMiddleware.cookie_name in response.cookies
+
+    # Сразу после записи клиент читает свои изменения с основной БД.
+    response, primary, replica = count_queries(
+        lambda: user_client.get('/api/recipes/?is_favorited=1')
+    )
+    assert response.json()['count'] == 1
+    assert primary > 0
+    assert replica == 0
+
+    # По токену клиент узнается и без cookie.
+    user_client.cookies.clear()
+    _, primary, replica = count_queries(
+        lambda: user_client.get('/api/recipes/')
+    )
+    assert primary > 0
+    assert replica == 0
+
+    time.sleep(STICKY_SECONDS + 0.1)
+    _, primary, replica = count_queries(
+        lambda: user_client.get('/api/recipes/')
+    )
+    assert primary == 0
+    assert replica > 0
+
+
+def test_reads_outside_requests_use_primary(make_recipes):
+    make_recipes(1)
+    assert Recipe.objects.all().db == 'default'
+
+
+def test_shopping_list_writes_use_primary(user, make_recipes):
+    # Запись внутри запроса на чтение: блокировка и чтения, от которых
+    # зависит список покупок, идут в основную БД.
+    recipe, = make_recipes(1)
+    ingredient_id = recipe.recipeingredient.first().ingredient_id
+    with read_from('replica_0'):
+        _, _, replica = count_queries(
+            lambda: ShoppingCart.objects.create(user=user, recipe_buy=recipe)
+        )
+        assert replica == 0
+        _, _, replica = count_queries(
+            lambda: ShoppingListItem.objects.add_amounts(
+                ShoppingCart.objects.values('user'),
+                {ingredient_id: (10, 0)},
+            )
+        )
+        assert replica == 0
+        _, _, replica = count_queries(
+            lambda: ShoppingListItem.objects.rebuild([user.pk])
+        )
+        assert replica == 0
+    assert sorted(
+        ShoppingListItem.objects.values_list('amount', flat=True)
+    ) == [100, 100, 100]
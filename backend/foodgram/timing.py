@@ -0,0 +1,31 @@
+"""Метрики Server-Timing от слоев ниже приложений, например от бэкенда
+БД.
+
+Профилировщик запроса (api.instrumentation) на время обработки
+подставляет словарь метрик через collect_timings(); вне профилируемого
+запроса record_timing ничего не делает.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_timings = ContextVar('request_timings', default=None)
+
+
+@contextmanager
+def collect_timings(timings):
+    """Метрики record_timing в этом контексте попадают в timings:
+    {name: (duration, description)}. None — не собирать."""
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def record_timing(name, duration, description=''):
+    """Добавляет метрику в Server-Timing текущего запроса, если он
+    профилируется. duration — в секундах."""
+    timings = _timings.get()
+    if timings is not None:
+        previous, _ = timings.get(name, (0.0, description))
+        timings[name] = (previous + duration, description)
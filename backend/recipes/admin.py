@@ -1,7 +1,8 @@
 from django.contrib import admin
 
 from .models import (Ingredient, Recipe, RecipeFavorite, RecipeIngredient,
-                     RecipeTag, ShoppingCart, Tag)
+                     RecipePopularity, RecipeTag, ShoppingCart,
+                     ShoppingListItem, Tag)
 
 
 class IngredientInline(admin.TabularInline):
@@ -45,8 +46,9 @@ class RecipeAdmin(admin.ModelAdmin):
         IngredientInline
     )
 
+    @admin.display(description='В избранном', ordering='favorites_count')
     def users_favorite(self, obj):
-        return RecipeFavorite.objects.filter(favorite_recipe=obj).count()
+        return obj.favorites_count
 
 
 class RecipeIngredientAdmin(admin.ModelAdmin):
@@ -107,6 +109,30 @@ class ShoppingChartAdmin(admin.ModelAdmin):
     )
 
 
+class RecipePopularityAdmin(admin.ModelAdmin):
+    list_display = (
+        'recipe',
+        'score',
+        'updated',
+    )
+    search_fields = (
+        'recipe__name',
+    )
+
+
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'ingredient',
+        'amount',
+        'recipes_count',
+    )
+    search_fields = (
+        'user__email',
+        'ingredient__name',
+    )
+
+
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
@@ -114,3 +140,5 @@ admin.site.register(RecipeTag, RecipeTagAdmin)
 admin.site.register(RecipeFavorite, RecipeFavoriteAdmin)
 admin.site.register(Tag, TagAdmin)
 admin.site.register(ShoppingCart, ShoppingChartAdmin)
+admin.site.register(RecipePopularity, RecipePopularityAdmin)
+admin.site.register(ShoppingListItem, ShoppingListItemAdmin)
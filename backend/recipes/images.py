@@ -0,0 +1,128 @@
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True,
+             'progressive': True},
+}
+
+
+# Метаданные, которые влияют на вид картинки и остаются в оригинале.
+KEPT_INFO = ('icc_profile', 'dpi', 'transparency')
+EXIF_ORIENTATION = 0x0112
+
+
+def strip_metadata(image_file):
+    """Копия загруженной картинки JPEG или PNG без EXIF и других
+    метаданных; None для остальных форматов.
+
+    Поворот из EXIF переносится в пиксели. JPEG без поворота
+    пересохраняется с исходными таблицами квантования, PNG — без потерь.
+    """
+    image_file.seek(0)
+    with Image.open(image_file) as source:
+        if source.format not in ('JPEG', 'PNG'):
+            return None
+        options = {
+            key: source.info[key] for key in KEPT_INFO if key in source.info
+        }
+        options['format'] = source.format
+        image = source
+        if source.getexif().get(EXIF_ORIENTATION, 1) != 1:
+            image = ImageOps.exif_transpose(source)
+            if source.format == 'JPEG':
+                options['quality'] = 95
+        elif source.format == 'JPEG':
+            options.update(quality='keep', subsampling='keep')
+        buffer = io.BytesIO()
+        image.save(buffer, **options)
+    return ContentFile(buffer.getvalue(), name=image_file.name)
+
+
+def encode(image, image_format):
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, **SAVE_OPTIONS[image_format])
+    return buffer.getvalue()
+
+
+def build_renditions(image_file):
+    """Уменьшенные копии картинки во всех форматах и ширинах.
+
+    Картинка декодируется один раз; копии собираются из пикселей, поэтому
+    EXIF и прочие метаданные в них не попадают. Имена файлов — хэш
+    содержимого, так что одинаковые копии не дублируются в хранилище.
+    """
+    image_file.open('rb')
+    try:
+        with Image.open(image_file) as source:
+            source = ImageOps.exif_transpose(source)
+            if source.mode not in ('RGB', 'RGBA'):
+                source = source.convert('RGBA' if 'A' in source.mode
+                                        else 'RGB')
+            source.load()
+            source.info = {}
+    finally:
+        image_file.close()
+
+    renditions = {}
+    for width in sorted(settings.RECIPE_IMAGE_RENDITIONS['WIDTHS']):
+        resized = source.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+        for image_format in settings.RECIPE_IMAGE_RENDITIONS['FORMATS']:
+            content = encode(resized, image_format)
+            digest = hashlib.sha256(content).hexdigest()[:20]
+            name = f'recipes/renditions/{digest}.{image_format}'
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(content))
+            renditions.setdefault(image_format, []).append({
+                'name': name,
+                'width': resized.width,
+                'height': resized.height,
+            })
+        # thumbnail() не увеличивает картинку: следующие ширины дали бы
+        # ту же копию.
+        if resized.size == source.size:
+            break
+    return renditions
+
+
+def update_renditions(recipe, force=False):
+    """Пересобирает копии, если картинка рецепта сменилась."""
+    current = recipe.image_renditions or {}
+    if not recipe.image or (
+        not force and current.get('source') == recipe.image.name
+    ):
+        return False
+    renditions = {
+        'source': recipe.image.name,
+        'formats': build_renditions(recipe.image),
+    }
+    recipe.image_renditions = renditions
+    type(recipe).objects.filter(pk=recipe.pk).update(
+        image_renditions=renditions
+    )
+    return True
+
+
+def get_srcset(recipe, request=None):
+    """Значения srcset по форматам: {'webp': 'url 480w, url 960w', ...}."""
+
+    def build_url(name):
+        url = default_storage.url(name)
+        return request.build_absolute_uri(url) if request else url
+
+    formats = (recipe.image_renditions or {}).get('formats', {})
+    return {
+        image_format: ', '.join(
+            f'{build_url(item["name"])} {item["width"]}w' for item in items
+        )
+        for image_format, items in formats.items()
+    }
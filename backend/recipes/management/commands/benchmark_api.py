@@ -0,0 +1,154 @@
+import json
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api import benchmark
+
+COLUMNS = ('p50_ms', 'p95_ms', 'queries', 'peak_alloc_kb')
+LOAD_COLUMNS = ('sync_rps', 'async_rps', 'sync_p95_ms', 'async_p95_ms')
+SERIALIZER_COLUMNS = ('serialize_ms', 'render_ms', 'recipes_per_s', 'equal')
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер горячих эндпоинтов API через тестовый клиент Django. '
+        'База заполняется командой seed_benchmark.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            help='Запустить только перечисленные сценарии.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Сохранить результаты в JSON-файл.',
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON-файл предыдущего прогона для сравнения.',
+        )
+        parser.add_argument(
+            '--base-url',
+            help=(
+                'Адрес запущенного сервера: вместо замера в процессе '
+                'сравнить синхронные и асинхронные эндпоинты под нагрузкой.'
+            ),
+        )
+        parser.add_argument(
+            '--async-base-url',
+            help=(
+                'Адрес ASGI-сервера, если он отличается от --base-url. '
+                'Нужен ASYNC_API_ENABLED=True '
+                '(infra/docker-compose.async.yml).'
+            ),
+        )
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Число запросов на сценарий в режиме --base-url.',
+        )
+        parser.add_argument(
+            '--serializers',
+            action='store_true',
+            help=(
+                'Сравнить сериализаторы и рендереры списка рецептов '
+                'на одной загруженной странице.'
+            ),
+        )
+        parser.add_argument('--page-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        if not benchmark.get_benchmark_user():
+            raise CommandError('База пуста, сначала запустите seed_benchmark.')
+
+        if options['serializers']:
+            results = benchmark.compare_serializers(
+                options['iterations'], options['page_size']
+            )
+            self.print_serializers_table(results)
+        elif options['base_url']:
+            results = benchmark.load(
+                options['base_url'],
+                options['async_base_url'],
+                options['concurrency'],
+                options['requests'],
+                options['only'],
+            )
+            self.print_load_table(results)
+        else:
+            results = benchmark.run(options['iterations'], options['only'])
+            baseline = (
+                self.load(options['compare']) if options['compare'] else {}
+            )
+            self.print_table(results, baseline.get('results', {}))
+
+        if options['output']:
+            report = {
+                'created': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'dataset': benchmark.dataset_summary(),
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}.')
+
+    def load(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+
+    def print_table(self, results, baseline):
+        self.stdout.write(
+            f'{"scenario":<28}' + ''.join(f'{c:>16}' for c in COLUMNS)
+        )
+        for name, result in results.items():
+            row = f'{name:<28}'
+            for column in COLUMNS:
+                value = result[column]
+                previous = baseline.get(name, {}).get(column)
+                if previous:
+                    delta = (value - previous) / previous * 100
+                    row += f'{value:>8} ({delta:+4.0f}%)'
+                else:
+                    row += f'{value:>16}'
+            if result['status'] >= 400:
+                row += f'  HTTP {result["status"]}'
+            self.stdout.write(row)
+
+    def print_load_table(self, results):
+        self.stdout.write(
+            f'{"scenario":<28}'
+            + ''.join(f'{c:>16}' for c in LOAD_COLUMNS)
+        )
+        for name, result in results.items():
+            row = f'{name:<28}'
+            for column in LOAD_COLUMNS:
+                mode, metric = column.split('_', 1)
+                row += f'{result[mode][metric]:>16}'
+            errors = result['sync']['errors'] + result['async']['errors']
+            if errors:
+                row += f'  ошибок: {errors}'
+            self.stdout.write(row)
+
+    def print_serializers_table(self, results):
+        self.stdout.write(
+            f'{"variant":<28}'
+            + ''.join(f'{c:>16}' for c in SERIALIZER_COLUMNS)
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<28}'
+                + ''.join(f'{str(result[c]):>16}' for c in SERIALIZER_COLUMNS)
+            )
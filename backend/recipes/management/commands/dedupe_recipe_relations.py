@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from recipes.models import RecipeIngredient, RecipeTag
+
+# Модель, поле-пара к рецепту и поле, которое суммируется при слиянии.
+RELATIONS = (
+    (RecipeIngredient, 'ingredient', 'amount'),
+    (RecipeTag, 'tag', None),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Слияние повторяющихся ингредиентов и тегов рецептов перед '
+        'созданием уникальных ограничений: остается строка с меньшим id, '
+        'количества ингредиента складываются. Запускается и автоматически '
+        'перед migrate.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='База данных, в которой сливаются дубли.',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        tables = connection.introspection.table_names()
+        with transaction.atomic(using=connection.alias):
+            for model, field, amount_field in RELATIONS:
+                # До первой миграции таблиц еще нет.
+                if model._meta.db_table not in tables:
+                    continue
+                removed = self.merge(connection, model, field, amount_field)
+                if removed:
+                    self.stdout.write(
+                        f'{model._meta.verbose_name_plural}: удалено '
+                        f'дублей {removed}.'
+                    )
+
+    def merge(self, connection, model, field, amount_field):
+        """Сливает строки с одинаковыми (рецепт, field) и возвращает
+        число удаленных.
+
+        Запросы без ORM: схема таблицы может отставать от модели, а
+        удаление через ORM вызвало бы сигналы списков покупок, хотя сумма
+        количеств рецепта не меняется.
+        """
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        pk = quote(model._meta.pk.column)
+        recipe = quote(model._meta.get_field('recipe').column)
+        other = quote(model._meta.get_field(field).column)
+        kept = (
+            f'SELECT MIN({pk}) FROM {table} GROUP BY {recipe}, {other}'
+        )
+        with connection.cursor() as cursor:
+            if amount_field is not None:
+                amount = quote(model._meta.get_field(amount_field).column)
+                cursor.execute(
+                    f'UPDATE {table} SET {amount} = ('
+                    f'SELECT SUM(d.{amount}) FROM {table} d '
+                    f'WHERE d.{recipe} = {table}.{recipe} '
+                    f'AND d.{other} = {table}.{other}) '
+                    f'WHERE {pk} IN ({kept} HAVING COUNT(*) > 1)'
+                )
+            cursor.execute(f'DELETE FROM {table} WHERE {pk} NOT IN ({kept})')
+            return cursor.rowcount
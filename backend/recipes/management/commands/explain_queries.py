@@ -0,0 +1,148 @@
+import functools
+from contextlib import ExitStack
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.http import QueryDict
+from rest_framework.settings import api_settings
+
+from api.filters import IngredientSearchFilter, RecipeFilter
+from api.shopping_list import shopping_list_queryset
+from recipes.models import (Ingredient, Recipe, RecipeFavorite,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import Subscription, User
+
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN основных запросов API. Строки плана с Seq Scan '
+        'выделяются, чтобы были видны пропавшие индексы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='EXPLAIN ANALYZE (только PostgreSQL).',
+        )
+        parser.add_argument(
+            '--user',
+            help='Email пользователя, от имени которого строятся запросы.',
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        recipe = Recipe.objects.first()
+        if recipe is None:
+            raise CommandError('В базе нет рецептов, сначала заполните ее.')
+        explain_options = {'analyze': True} if options['analyze'] else {}
+
+        for name, query in self.get_queries(user, recipe):
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            if callable(query):
+                plan = self.explain_executed(query, explain_options)
+            else:
+                plan = query.explain(**explain_options)
+            for line in plan.splitlines():
+                if 'Seq Scan' in line:
+                    self.stdout.write(self.style.WARNING(line))
+                else:
+                    self.stdout.write(line)
+            self.stdout.write('')
+
+    def explain_executed(self, run, explain_options):
+        """План последнего SQL, выполненного run().
+
+        Так разбираются запросы, которые ORM не отдает как QuerySet,
+        например COUNT пагинатора.
+        """
+        executed = []
+        with ExitStack() as stack:
+            for alias_connection in connections.all():
+                stack.enter_context(alias_connection.execute_wrapper(
+                    functools.partial(self.capture, executed, alias_connection)
+                ))
+            run()
+        query_connection, sql, params = executed[-1]
+        prefix = query_connection.ops.explain_query_prefix(**explain_options)
+        with query_connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            # Строки плана, как их собирает QuerySet.explain().
+            return '\n'.join(
+                ' '.join(map(str, row)) for row in cursor.fetchall()
+            )
+
+    @staticmethod
+    def capture(executed, connection, execute, sql, params, many, context):
+        executed.append((connection, sql, params))
+        return execute(sql, params, many, context)
+
+    def search_ingredients(self, query):
+        """Запрос IngredientSearchFilter с лимитом автодополнения."""
+        request = SimpleNamespace(
+            query_params={api_settings.SEARCH_PARAM: query}
+        )
+        return IngredientSearchFilter().filter_queryset(
+            request, Ingredient.objects.all(), view=None
+        )[:settings.INGREDIENT_AUTOCOMPLETE['LIMIT']]
+
+    def get_user(self, email):
+        if email is None:
+            return (
+                User.objects.filter(favorites__isnull=False).first()
+                or User.objects.first()
+                or AnonymousUser()
+            )
+        try:
+            return User.objects.get(email=email)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {email} не найден.')
+
+    def filter_recipes(self, user, **params):
+        data = QueryDict(mutable=True)
+        for key, value in params.items():
+            data.setlist(key, value if isinstance(value, list) else [value])
+        return RecipeFilter(
+            data=data,
+            queryset=Recipe.objects.with_user_flags(user),
+            request=SimpleNamespace(user=user),
+        ).qs
+
+    def get_queries(self, user, recipe):
+        page = Recipe.objects.with_related().with_user_flags(user)
+        slugs = list(Tag.objects.values_list('slug', flat=True)[:2])
+        page_ids = list(page.values_list('pk', flat=True)[:PAGE_SIZE])
+        queries = [
+            ('Список рецептов', page[:PAGE_SIZE]),
+            ('Число рецептов', page.count),
+            ('Рецепты по тегам', self.filter_recipes(
+                user, tags=slugs)[:PAGE_SIZE]),
+            ('Рецепты автора', self.filter_recipes(
+                user, author=str(recipe.author_id))[:PAGE_SIZE]),
+            ('Ингредиенты страницы', RecipeIngredient.objects.filter(
+                recipe__in=page_ids).select_related('ingredient')),
+            ('Поиск ингредиента', self.search_ingredients(
+                recipe.name[:2])),
+        ]
+        if not user.is_anonymous:
+            queries += [
+                ('Избранное пользователя', RecipeFavorite.objects.filter(
+                    user=user).values_list('favorite_recipe_id')),
+                ('Список покупок пользователя', ShoppingCart.objects.filter(
+                    user=user).values_list('recipe_buy_id')),
+                ('Подписки пользователя', Subscription.objects.filter(
+                    user=user).values_list('author_id')),
+                ('Подписки', User.objects.filter(
+                    subscribing__user=user
+                )[:PAGE_SIZE]),
+                ('Последние рецепты авторов', Recipe.objects.filter(
+                    author__subscribing__user=user
+                ).latest_per_author(3)),
+                ('Агрегация списка покупок', shopping_list_queryset(user)),
+            ]
+        return queries
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import update_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий картинок для существующих рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать копии даже для уже обработанных рецептов.',
+        )
+
+    def handle(self, *args, **options):
+        updated = failed = 0
+        recipes = Recipe.objects.only('pk', 'image', 'image_renditions')
+        for recipe in recipes.iterator(chunk_size=200):
+            try:
+                if update_renditions(recipe, force=options['force']):
+                    updated += 1
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.pk}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {updated}, с ошибками: {failed}.'
+        ))
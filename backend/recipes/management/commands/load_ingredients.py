@@ -1,23 +1,165 @@
 import csv
+import json
+import re
+import time
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from api.autocomplete import INGREDIENTS_GENERATION
+from api.cache import bump_generation
 from recipes.models import Ingredient
 
+JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def clean_row(row):
+    """Пара (название, единица) без пробелов по краям или None, если
+    в строке меньше двух непустых ячеек."""
+    if len(row) < 2:
+        return None
+    name, unit = row
+    if not isinstance(name, str) or not isinstance(unit, str):
+        return None
+    name, unit = name.strip(), unit.strip()
+    return (name, unit) if name and unit else None
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """Элементы JSON-массива из file по одному.
+
+    Файл читается кусками по chunk_size символов, в памяти держится
+    только недочитанный хвост: разобранное начало буфера отбрасывается
+    раз на прочитанный кусок, а не после каждого элемента. Ошибки
+    разметки — json.JSONDecodeError, позиция в ней считается от начала
+    буфера.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    # Что ожидается дальше: '[', значение или ']', значение, ',' или ']'.
+    expected = '['
+    while True:
+        pos = JSON_WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer) and not eof:
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        char = buffer[pos:pos + 1]
+        if expected == '[':
+            if char != '[':
+                raise json.JSONDecodeError('Ожидался массив', buffer, pos)
+            pos += 1
+            expected = 'value or ]'
+        elif char == ']' and expected != 'value':
+            rest = buffer[pos + 1:] + file.read()
+            if rest.strip():
+                raise json.JSONDecodeError(
+                    'Лишние данные после массива', rest, 0
+                )
+            return
+        elif expected == ', or ]':
+            if char != ',':
+                raise json.JSONDecodeError('Ожидалась запятая', buffer, pos)
+            pos += 1
+            expected = 'value'
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            # Значение могло оборваться на границе куска; число у самого
+            # конца тоже может продолжиться в следующем.
+            if end is None or (end == len(buffer) and not eof):
+                chunk = file.read(chunk_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield item
+            pos = end
+            expected = ', or ]'
+
 
 class Command(BaseCommand):
+    help = 'Загрузка ингредиентов из CSV или JSON пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default='./data/ingredients.csv',
+            help='Путь к файлу с ингредиентами (.csv или .json).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одной транзакции.',
+        )
 
     def handle(self, *args, **options):
-        self.import_ingredients()
-        print('Загрузка ингредиентов завершена.')
-
-    def import_ingredients(self, file='ingredients.csv'):
-        print(f'Загрузка файла {file}.')
-        file_path = f'./data/{file}'
-        with open(file_path, newline='', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                status, created = Ingredient.objects.update_or_create(
-                    name=row[0],
-                    measurement_unit=row[1]
-                )
+        path = options['path']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+
+        self.stdout.write(f'Загрузка файла {path}.')
+        started = time.monotonic()
+        total_before = Ingredient.objects.count()
+        read = 0
+        incomplete = 0
+        try:
+            with open(path, newline='', encoding='utf-8') as f:
+                rows = self.read_rows(f, path)
+                while batch := list(islice(rows, batch_size)):
+                    read += len(batch)
+                    batch = [clean_row(row) for row in batch]
+                    incomplete += batch.count(None)
+                    self.insert_batch([row for row in batch if row])
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        except (json.JSONDecodeError, csv.Error) as error:
+            # Пачки, загруженные до ошибки, остаются в базе.
+            raise CommandError(
+                f'Некорректный файл {path} после {read} строк: {error}'
+            )
+        inserted = Ingredient.objects.count() - total_before
+        elapsed = time.monotonic() - started
+
+        # С общим кэшем индекс и ETag ингредиентов обновятся сразу, с
+        # кэшем в памяти процесса поколение видно только этой команде:
+        # веб-процессы перечитают индекс через INDEX_TTL.
+        bump_generation(INGREDIENTS_GENERATION)
+        self.stdout.write(self.style.SUCCESS(
+            'Загрузка ингредиентов завершена. '
+            f'Прочитано: {read}, добавлено: {inserted}, '
+            f'пропущено: {read - inserted} (неполных строк: {incomplete}), '
+            f'{read / elapsed if elapsed else read:.0f} строк/с.'
+        ))
+
+    def read_rows(self, file, path):
+        if path.endswith('.json'):
+            for item in iter_json_array(file):
+                if isinstance(item, dict):
+                    yield item.get('name'), item.get('measurement_unit')
+                elif isinstance(item, list):
+                    yield tuple(item[:2])
+                else:
+                    yield ()
+        else:
+            for row in csv.reader(file):
+                yield tuple(row[:2])
+
+    @transaction.atomic
+    def insert_batch(self, batch):
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(name=name, measurement_unit=unit)
+                for name, unit in dict.fromkeys(batch)
+            ),
+            ignore_conflicts=True,
+        )
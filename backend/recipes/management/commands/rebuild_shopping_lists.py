@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересборка списков покупок из корзин. Нужна после заполнения '
+        'базы в обход сигналов и для сверки предрасчитанных строк.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            help='Email пользователя; по умолчанию пересобираются все.',
+        )
+
+    def handle(self, *args, **options):
+        users = None
+        if options['user']:
+            users = list(User.objects.filter(email__in=options['user']))
+            missing = set(options['user']) - {user.email for user in users}
+            if missing:
+                raise CommandError(
+                    f'Пользователи не найдены: {", ".join(sorted(missing))}.'
+                )
+        rows = ShoppingListItem.objects.rebuild(users)
+        self.stdout.write(
+            self.style.SUCCESS(f'Списки покупок пересобраны: {rows} строк.')
+        )
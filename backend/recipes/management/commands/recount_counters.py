@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe, RecipeFavorite, ShoppingCart
+from users.models import Subscription, User
+
+
+def count_of(model, fk_field):
+    return Coalesce(
+        Subquery(
+            model.objects
+            .filter(**{fk_field: OuterRef('pk')})
+            .order_by()
+            .values(fk_field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+COUNTERS = (
+    (Recipe, 'favorites_count', RecipeFavorite, 'favorite_recipe'),
+    (Recipe, 'shopping_cart_count', ShoppingCart, 'recipe_buy'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчет счетчиков избранного, покупок, рецептов и подписчиков.'
+
+    def handle(self, *args, **options):
+        for model, field, source, fk_field in COUNTERS:
+            actual = count_of(source, fk_field)
+            fixed = (
+                model.objects
+                .filter(~Q(**{field: actual}))
+                .update(**{field: actual})
+            )
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}.{field}: '
+                f'исправлено {fixed}.'
+            )
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны.'))
@@ -0,0 +1,205 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.autocomplete import INGREDIENTS_GENERATION
+from api.cache import RECIPES_GENERATION, bump_generation
+from recipes.models import (Ingredient, Recipe, RecipeFavorite,
+                            RecipeIngredient, RecipeTag, ShoppingCart, Tag)
+from users.models import Subscription, User
+
+USERNAME_PREFIX = 'bench_'
+BENCHMARK_PASSWORD = 'benchmark-password'
+HISTORY_DAYS = 365
+
+
+def zipf_weights(count, exponent=1.1):
+    """Веса «длинного хвоста»: немногие объекты собирают большую часть
+    активности, как авторы и популярные рецепты в продакшене."""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+class Command(BaseCommand):
+    help = 'Заполнение базы синтетическими данными для нагрузочных тестов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument('--subscriptions-per-user', type=int, default=10)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+
+        tags = self.ensure_tags(options['tags'])
+        ingredients = self.ensure_ingredients(options['ingredients'])
+        users = self.create_users(options['users'])
+        recipes = self.create_recipes(users, options['recipes'])
+        self.create_recipe_relations(recipes, tags, ingredients)
+        self.create_user_relations(
+            users, recipes, options['favorites_per_user'], RecipeFavorite,
+            'favorite_recipe_id',
+        )
+        self.create_user_relations(
+            users, recipes, options['cart_per_user'], ShoppingCart,
+            'recipe_buy_id',
+        )
+        self.create_subscriptions(users, options['subscriptions_per_user'])
+
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('rebuild_shopping_lists', stdout=self.stdout)
+        bump_generation(RECIPES_GENERATION)
+        bump_generation(INGREDIENTS_GENERATION)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, рецептов: {len(recipes)}. '
+            f'Пароль пользователей {USERNAME_PREFIX}*: {BENCHMARK_PASSWORD}.'
+        ))
+
+    def random_past(self):
+        return self.now - timedelta(
+            seconds=self.random.randint(0, HISTORY_DAYS * 24 * 3600)
+        )
+
+    def ensure_tags(self, count):
+        existing = Tag.objects.count()
+        Tag.objects.bulk_create((
+            Tag(
+                name=f'Тег {number}',
+                color=f'#{number:06X}',
+                slug=f'{USERNAME_PREFIX}tag_{number}',
+            )
+            for number in range(existing, count)
+        ), ignore_conflicts=True)
+        return list(Tag.objects.values_list('pk', flat=True))
+
+    def ensure_ingredients(self, count):
+        existing = Ingredient.objects.count()
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+                for number in range(existing, count)
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        return list(Ingredient.objects.values_list('pk', flat=True))
+
+    @transaction.atomic
+    def create_users(self, count):
+        start = User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).count()
+        password = make_password(BENCHMARK_PASSWORD)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'{USERNAME_PREFIX}{number}',
+                    email=f'{USERNAME_PREFIX}{number}@example.com',
+                    first_name='Бенч',
+                    last_name=f'Пользователь {number}',
+                    password=password,
+                )
+                for number in range(start, start + count)
+            ),
+            batch_size=self.batch_size,
+        )
+        return list(
+            User.objects
+            .filter(username__startswith=USERNAME_PREFIX)
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+    @transaction.atomic
+    def create_recipes(self, users, count):
+        start = Recipe.objects.filter(author__in=users).count()
+        authors = self.random.choices(
+            users, weights=zipf_weights(len(users)), k=count
+        )
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=author,
+                    name=f'Рецепт {number}',
+                    text=f'Описание рецепта {number}. ' * 5,
+                    cooking_time=self.random.randint(5, 180),
+                    image='recipes/benchmark.png',
+                )
+                for number, author in enumerate(authors, start=start)
+            ),
+            batch_size=self.batch_size,
+        )
+        recipes = list(
+            Recipe.objects.filter(author__in=users, pub_date__gte=self.now)
+        )
+        for recipe in recipes:
+            recipe.pub_date = self.random_past()
+        Recipe.objects.bulk_update(
+            recipes, ['pub_date'], batch_size=self.batch_size
+        )
+        return [recipe.pk for recipe in recipes]
+
+    @transaction.atomic
+    def create_recipe_relations(self, recipes, tags, ingredients):
+        recipe_tags = []
+        recipe_ingredients = []
+        for recipe in recipes:
+            for tag in self.random.sample(
+                tags, k=min(len(tags), self.random.randint(1, 3))
+            ):
+                recipe_tags.append(RecipeTag(recipe_id=recipe, tag_id=tag))
+            count = min(len(ingredients), self.random.randint(3, 12))
+            for ingredient in self.random.sample(ingredients, k=count):
+                recipe_ingredients.append(RecipeIngredient(
+                    recipe_id=recipe,
+                    ingredient_id=ingredient,
+                    amount=self.random.randint(1, 500),
+                ))
+        RecipeTag.objects.bulk_create(recipe_tags, batch_size=self.batch_size)
+        RecipeIngredient.objects.bulk_create(
+            recipe_ingredients, batch_size=self.batch_size
+        )
+
+    @transaction.atomic
+    def create_user_relations(self, users, recipes, per_user, model, field):
+        weights = zipf_weights(len(recipes))
+        rows = []
+        for user in users:
+            count = self.random.randint(0, per_user * 2)
+            chosen = set(self.random.choices(recipes, weights, k=count))
+            rows.extend(
+                model(user_id=user, created=self.random_past(),
+                      **{field: recipe})
+                for recipe in chosen
+            )
+        model.objects.bulk_create(
+            rows, batch_size=self.batch_size, ignore_conflicts=True
+        )
+
+    @transaction.atomic
+    def create_subscriptions(self, users, per_user):
+        weights = zipf_weights(len(users))
+        rows = []
+        for user in users:
+            count = self.random.randint(0, per_user * 2)
+            authors = set(self.random.choices(users, weights, k=count))
+            authors.discard(user)
+            rows.extend(
+                Subscription(user_id=user, author_id=author)
+                for author in authors
+            )
+        Subscription.objects.bulk_create(
+            rows, batch_size=self.batch_size, ignore_conflicts=True
+        )
@@ -0,0 +1,145 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from recipes.models import (FAVORITE_WEIGHT, SHOPPING_CART_WEIGHT,
+                            PopularityEvent, Recipe, RecipeFavorite,
+                            RecipePopularity, ShoppingCart)
+
+HISTORY_HALF_LIVES = 10
+EVENTS_BATCH_SIZE = 5000
+# Столько стоит одно избранное на краю окна истории: рецепты с меньшим
+# рейтингом убираются из таблицы и из выдачи популярных.
+MIN_SCORE = FAVORITE_WEIGHT * 0.5 ** HISTORY_HALF_LIVES
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчет рейтинга популярных рецептов. Старый рейтинг затухает '
+        'экспоненциально, к нему добавляются события из журнала: новые '
+        'избранные и покупки со знаком плюс, удаленные — со знаком минус. '
+        'События старше окна истории и рецепты с рейтингом ниже '
+        'минимального удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--half-life-hours',
+            type=float,
+            default=72,
+            help='Период полураспада рейтинга в часах.',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Пересчитать рейтинг с нуля.',
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        now = timezone.now()
+        half_life = timedelta(hours=options['half_life_hours'])
+        since = now - half_life * HISTORY_HALF_LIVES
+        last_run = RecipePopularity.objects.aggregate(
+            last_run=Max('updated')
+        )['last_run']
+
+        increments = defaultdict(float)
+        if options['full'] or last_run is None:
+            # События до этой границы уже есть в таблицах избранного и
+            # корзины и учитываются из них.
+            last_event = PopularityEvent.objects.aggregate(
+                last_event=Max('id')
+            )['last_event']
+            RecipePopularity.objects.all().delete()
+            self.count_history(increments, since, now, half_life)
+            if last_event is not None:
+                PopularityEvent.objects.filter(id__lte=last_event).delete()
+        else:
+            RecipePopularity.objects.update(
+                score=F('score') * self.decay(now - last_run, half_life),
+                updated=now,
+            )
+            # Вклад таких событий меньше MIN_SCORE, а копятся они, если
+            # команда долго не запускалась.
+            PopularityEvent.objects.filter(created__lte=since).delete()
+            self.consume_events(increments, now, half_life)
+
+        existing = RecipePopularity.objects.in_bulk(list(increments))
+        for recipe_id, popularity in existing.items():
+            popularity.score = max(
+                popularity.score + increments[recipe_id], 0
+            )
+            popularity.updated = now
+        RecipePopularity.objects.bulk_update(
+            existing.values(), ['score', 'updated'], batch_size=1000
+        )
+        # Рецепты из журнала могли быть удалены.
+        new_ids = Recipe.objects.filter(
+            pk__in=[
+                recipe_id for recipe_id, score in increments.items()
+                if recipe_id not in existing and score >= MIN_SCORE
+            ]
+        ).values_list('pk', flat=True)
+        RecipePopularity.objects.bulk_create(
+            (
+                RecipePopularity(
+                    recipe_id=recipe_id, score=increments[recipe_id],
+                    updated=now,
+                )
+                for recipe_id in new_ids.iterator()
+            ),
+            batch_size=1000,
+        )
+        removed, _ = RecipePopularity.objects.filter(
+            score__lt=MIN_SCORE
+        ).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинг обновлен: {len(increments)} рецептов с новыми '
+            f'событиями, {len(existing)} из них уже были в рейтинге, '
+            f'{removed} выбыли из рейтинга.'
+        ))
+
+    def count_history(self, increments, since, now, half_life):
+        for model, fk_field, weight in (
+            (RecipeFavorite, 'favorite_recipe_id', FAVORITE_WEIGHT),
+            (ShoppingCart, 'recipe_buy_id', SHOPPING_CART_WEIGHT),
+        ):
+            events = model.objects.filter(
+                created__gt=since, created__lte=now
+            ).values_list(fk_field, 'created').order_by()
+            for recipe_id, created in events.iterator():
+                increments[recipe_id] += weight * self.decay(
+                    now - created, half_life
+                )
+
+    def consume_events(self, increments, now, half_life):
+        """Учитывает события журнала и удаляет учтенные.
+
+        Удаляются только прочитанные строки: событие, закоммиченное
+        позже с меньшим id, останется до следующего запуска. Удаление
+        вычитает вклад с тем же временем добавления, так что он
+        погашается точно.
+        """
+        consumed = []
+        events = PopularityEvent.objects.values_list(
+            'id', 'recipe_id', 'weight', 'created'
+        )
+        for pk, recipe_id, weight, created in events.iterator():
+            increments[recipe_id] += weight * self.decay(
+                now - created, half_life
+            )
+            consumed.append(pk)
+        for start in range(0, len(consumed), EVENTS_BATCH_SIZE):
+            PopularityEvent.objects.filter(
+                pk__in=consumed[start:start + EVENTS_BATCH_SIZE]
+            ).delete()
+
+    @staticmethod
+    def decay(age, half_life):
+        return 0.5 ** (age / half_life)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Заполнение поискового вектора для существующих рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько рецептов обновлять одним запросом.',
+        )
+
+    def handle(self, *args, **options):
+        if connections[Recipe.objects.db].vendor != 'postgresql':
+            raise CommandError('Полнотекстовый поиск доступен только в '
+                               'PostgreSQL.')
+        batch_size = options['batch_size']
+        pks = list(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+        updated = 0
+        for start in range(0, len(pks), batch_size):
+            updated += Recipe.objects.filter(
+                pk__in=pks[start:start + batch_size]
+            ).update_search_vector()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рецептов: {updated}.'
+        ))
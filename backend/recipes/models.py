@@ -1,11 +1,38 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import (Case, Count, Exists, F, OuterRef, Prefetch,
+                              Subquery, Sum, Value, When)
+from django.utils import timezone
+
+from users.models import CountersMixin, Subscription
 
 User = get_user_model()
 
 MAX_LENGTH_NAME = 200
 MAX_LENGTH_COLOR_AND_MEASUREMENT = 40
+SEARCH_CONFIG = 'russian'
+
+
+class SearchVectorIndex(GinIndex):
+    """GIN-индекс поискового вектора.
+
+    В Meta он объявлен всегда, поэтому миграции не зависят от того, на
+    какой СУБД их создали. В других СУБД (SQLite в тестах) вместо него
+    создается обычный индекс.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().create_sql(
+                model, schema_editor, using=using, **kwargs
+            )
+        return models.Index.create_sql(
+            self, model, schema_editor, using=using, **kwargs
+        )
 
 
 class Tag(models.Model):
@@ -64,7 +91,79 @@ class Ingredient(models.Model):
         return f'{self.name[:15]}, {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        """Автор, теги и ингредиенты загружаются пачкой на страницу."""
+        return self.select_related('author').defer(
+            'search_vector'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient'),
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """Флаги избранного, корзины и подписки на автора для user."""
+        if user is None or user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                author_is_subscribed=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(RecipeFavorite.objects.filter(
+                user=user, favorite_recipe=OuterRef('pk'),
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe_buy=OuterRef('pk'),
+            )),
+            author_is_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author'),
+            )),
+        )
+
+    def latest_per_author(self, limit=None):
+        """Не больше limit последних рецептов каждого автора.
+
+        Коррелированный подзапрос с LIMIT позволяет выбрать рецепты всех
+        авторов страницы одним запросом в prefetch.
+        """
+        queryset = self.order_by('-pub_date', '-id')
+        if limit is None:
+            return queryset
+        return queryset.filter(pk__in=Subquery(
+            Recipe.objects
+            .filter(author=OuterRef('author'))
+            .order_by('-pub_date', '-id')
+            .values('pk')[:limit]
+        ))
+
+    def update_search_vector(self):
+        """Пересчитывает поисковый вектор: название, ингредиенты, описание.
+
+        Вне PostgreSQL вектор не ведется, поиск идет по подстроке.
+        """
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        ingredient_names = (
+            Recipe.objects
+            .filter(pk=OuterRef('pk'))
+            .annotate(names=StringAgg('ingredients__name', ' '))
+            .values('names')
+        )
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(
+                Subquery(ingredient_names), weight='B', config=SEARCH_CONFIG
+            )
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+        ))
+
+
+class Recipe(CountersMixin, models.Model):
     name = models.CharField(
         'Название блюда',
         blank=False,
@@ -111,15 +210,52 @@ class Recipe(models.Model):
         upload_to='recipes/',
         help_text='Выберите картинку для вашего рецепта',
     )
+    image_renditions = models.JSONField(
+        'Уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     pub_date = models.DateTimeField(
         'Время публикации',
         auto_now_add=True
     )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        'Добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = ('favorites_count', 'shopping_cart_count')
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', 'id'], name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx',
+            ),
+            SearchVectorIndex(
+                fields=['search_vector'], name='recipe_search_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name[:15]
@@ -147,6 +283,12 @@ class RecipeIngredient(models.Model):
         ordering = ['-id']
         verbose_name = 'Ингредиент рецепта'
         verbose_name_plural = 'Ингредиенты рецепта'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'ingredient'],
+                name='unique_recipe_ingredient'
+            )
+        ]
 
     def __str__(self):
         return f'{self.recipe}, {self.ingredient}'
@@ -168,6 +310,17 @@ class RecipeTag(models.Model):
         ordering = ['recipe']
         verbose_name = 'Тег рецепта'
         verbose_name_plural = 'Теги рецепта'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'tag'],
+                name='unique_recipe_tag'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipe'], name='recipetag_tag_recipe_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.recipe} {self.tag}'
@@ -186,6 +339,12 @@ class RecipeFavorite(models.Model):
         related_name='favorite',
         verbose_name='избранный рецепт'
     )
+    created = models.DateTimeField(
+        'Добавлено',
+        default=timezone.now,
+        editable=False,
+        db_index=True,
+    )
 
     class Meta:
         ordering = ['user']
@@ -215,6 +374,12 @@ class ShoppingCart(models.Model):
         related_name='shopping_cart',
         verbose_name='Ингридиенты рецепта',
     )
+    created = models.DateTimeField(
+        'Добавлено',
+        default=timezone.now,
+        editable=False,
+        db_index=True,
+    )
 
     class Meta:
         ordering = ['user']
@@ -229,3 +394,198 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} added {self.recipe_buy} in shopping chart'
+
+
+FAVORITE_WEIGHT = 1.0
+SHOPPING_CART_WEIGHT = 2.0
+
+
+class RecipePopularity(models.Model):
+    """Предрасчитанный рейтинг рецепта для ленты популярного."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popularity',
+        verbose_name='Рецепт',
+    )
+    score = models.FloatField(
+        'Рейтинг',
+        default=0,
+    )
+    updated = models.DateTimeField(
+        'Время расчета',
+        default=timezone.now,
+    )
+
+    class Meta:
+        ordering = ['-score']
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        indexes = [
+            models.Index(
+                fields=['-score', '-recipe'], name='popularity_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} {self.score:.2f}'
+
+
+class PopularityEvent(models.Model):
+    """Добавление или удаление избранного и покупки, еще не учтенное
+    в рейтинге. Журнал пишут сигналы, разбирает update_popularity.
+
+    recipe_id — не внешний ключ: при удалении рецепта события его
+    избранного пишутся уже после того, как каскад собран.
+    """
+
+    recipe_id = models.PositiveBigIntegerField('Рецепт')
+    weight = models.FloatField('Вес')
+    created = models.DateTimeField('Время добавления')
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Событие рейтинга'
+        verbose_name_plural = 'События рейтинга'
+
+    def __str__(self):
+        return f'{self.recipe_id} {self.weight:+g}'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+
+    def for_write(self):
+        """Копия в БД для записи, если БД не выбрана явно.
+
+        Внутри запроса чтение по умолчанию идет с реплики, а блокировки
+        и чтения, от которых зависит запись, нужны в основной БД.
+        """
+        if self._db is not None:
+            return self
+        return self.using(router.db_for_write(self.model))
+
+    def add_amounts(self, users, changes):
+        """Прибавляет changes к спискам покупок users.
+
+        changes — {ingredient_id: (amount, recipes)}, отрицательные
+        значения вычитаются. Строки без рецептов удаляются. Строки
+        пользователей блокируются, чтобы одновременные изменения одного
+        списка не разошлись.
+        """
+        if not changes:
+            return
+        items = self.for_write()
+        if isinstance(users, models.QuerySet):
+            users = users.using(items.db)
+        with transaction.atomic(using=items.db):
+            user_ids = list(
+                User.objects.using(items.db).select_for_update()
+                .filter(pk__in=users).order_by('pk')
+                .values_list('pk', flat=True)
+            )
+            if not user_ids:
+                return
+            rows = items.filter(user__in=user_ids, ingredient__in=changes)
+            existing = set(rows.values_list('user_id', 'ingredient_id'))
+            rows.update(**{
+                field: F(field) + Case(
+                    *(
+                        When(ingredient_id=ingredient_id, then=Value(delta))
+                        for ingredient_id, delta in deltas.items()
+                    ),
+                    default=Value(0),
+                )
+                for field, deltas in (
+                    ('amount', {
+                        pk: amount for pk, (amount, _) in changes.items()
+                    }),
+                    ('recipes_count', {
+                        pk: recipes for pk, (_, recipes) in changes.items()
+                    }),
+                )
+            })
+            items.bulk_create(
+                self.model(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=amount,
+                    recipes_count=recipes,
+                )
+                for user_id in user_ids
+                for ingredient_id, (amount, recipes) in changes.items()
+                if recipes > 0 and (user_id, ingredient_id) not in existing
+            )
+            rows.filter(recipes_count__lte=0).delete()
+
+    def rebuild(self, users=None):
+        """Пересобирает списки покупок users (всех, если None) из корзин.
+
+        Возвращает число строк в пересобранных списках.
+        """
+        items = rows = self.for_write()
+        in_carts = {'recipe__shopping_cart__isnull': False}
+        if users is not None:
+            if isinstance(users, models.QuerySet):
+                users = users.using(items.db)
+            in_carts = {'recipe__shopping_cart__user__in': users}
+            rows = rows.filter(user__in=users)
+        totals = RecipeIngredient.objects.using(items.db).filter(
+            **in_carts
+        ).values(
+            'recipe__shopping_cart__user', 'ingredient'
+        ).annotate(
+            total=Sum('amount'), recipes=Count('pk')
+        ).order_by()
+        with transaction.atomic(using=items.db):
+            rows.delete()
+            return len(items.bulk_create(
+                (
+                    self.model(
+                        user_id=row['recipe__shopping_cart__user'],
+                        ingredient_id=row['ingredient'],
+                        amount=row['total'],
+                        recipes_count=row['recipes'],
+                    )
+                    for row in totals.iterator()
+                ),
+                batch_size=1000,
+            ))
+
+
+class ShoppingListItem(models.Model):
+    """Ингредиент в списке покупок пользователя: сумма по всем рецептам
+    корзины. Ведется сигналами при изменении корзины и ингредиентов
+    рецептов, сверяется командой rebuild_shopping_lists."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField('Количество')
+    recipes_count = models.IntegerField('Рецептов в корзине')
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['user']
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Строки списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient} {self.amount}'
@@ -1,5 +1,229 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib import parse
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
-class RecipesResultsPagination(PageNumberPagination):
+
+class CountingCursorPagination(CursorPagination):
+    """Курсорная пагинация; общее число записей — только по ?count=true,
+    и оно кэшируется."""
+
+    page_size_query_param = 'limit'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'true':
+            self.count = self.get_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset):
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            # Пустой фильтр, например none() или pk__in по пустому списку.
+            return 0
+        key = 'pagination:count:' + hashlib.md5(
+            f'{sql}{params}'.encode()
+        ).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data['count'] = self.count
+        return response
+
+
+class KeysetPagination(BasePagination):
+    """Курсор по паре (score_field, pk) по убыванию.
+
+    Следующая страница выбирается условием по паре, а не OFFSET, и без
+    COUNT, поэтому глубокие страницы стоят столько же, сколько первая.
+    Ответ в формате CursorPagination: next, previous, results.
+    """
+
+    cursor_query_param = 'cursor'
     page_size_query_param = 'limit'
+    score_field = 'score'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[0]
+        if cursor is not None:
+            _, score, pk = cursor
+            after = 'gt' if reverse else 'lt'
+            queryset = queryset.filter(
+                Q(**{f'{self.score_field}__{after}': score})
+                | Q(**{self.score_field: score, f'pk__{after}': pk})
+            )
+        ordering = (self.score_field, 'pk')
+        if not reverse:
+            ordering = tuple(f'-{field}' for field in ordering)
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+        self.next_position = self.previous_position = None
+        if results:
+            if has_more or reverse:
+                self.next_position = self.get_position(results[-1])
+            if has_more if reverse else cursor is not None:
+                self.previous_position = self.get_position(results[0])
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return page_size if page_size > 0 else api_settings.PAGE_SIZE
+
+    def get_position(self, instance):
+        return getattr(instance, self.score_field), instance.pk
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            query = parse.parse_qs(
+                b64decode(encoded.encode()).decode(), strict_parsing=True
+            )
+            return (
+                query.get('r', ['0'])[0] == '1',
+                float(query['s'][0]),
+                int(query['p'][0]),
+            )
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position, reverse):
+        score, pk = position
+        query = {'s': repr(score), 'p': pk}
+        if reverse:
+            query['r'] = 1
+        encoded = b64encode(parse.urlencode(query).encode()).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class CursorOptInPagination(BasePagination):
+    """Постраничная пагинация по умолчанию.
+
+    Курсорная включается запросом: ?pagination=cursor для первой
+    страницы или ?cursor=... для следующих. Курсор не делает COUNT и
+    OFFSET, поэтому стоимость страницы не зависит от глубины.
+    """
+
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    cursor_ordering = '-id'
+    page_number_only_actions = ()
+    page_number_only_params = ()
+    # Действия со своей пагинацией по ключу: {action: класс}.
+    keyset_paginators = {}
+
+    def use_cursor(self, request, view):
+        if getattr(view, 'action', None) in self.page_number_only_actions:
+            return False
+        if any(
+            request.query_params.get(param)
+            for param in self.page_number_only_params
+        ):
+            return False
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def get_page_number_paginator(self):
+        paginator = PageNumberPagination()
+        paginator.page_size_query_param = 'limit'
+        return paginator
+
+    def get_cursor_paginator(self):
+        paginator = CountingCursorPagination()
+        paginator.ordering = self.cursor_ordering
+        return paginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        keyset_paginator = self.keyset_paginators.get(
+            getattr(view, 'action', None)
+        )
+        if keyset_paginator is not None:
+            self.paginator = keyset_paginator()
+        elif self.use_cursor(request, view):
+            self.paginator = self.get_cursor_paginator()
+        else:
+            self.paginator = self.get_page_number_paginator()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.get_page_number_paginator().get_paginated_response_schema(
+            schema
+        )
+
+    @property
+    def display_page_controls(self):
+        return getattr(self, 'paginator', None) is not None and (
+            self.paginator.display_page_controls
+        )
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+
+class DefaultResultsPagination(CursorOptInPagination):
+    cursor_ordering = '-id'
+
+
+class PopularResultsPagination(KeysetPagination):
+    score_field = 'popularity_score'
+
+
+class RecipesResultsPagination(CursorOptInPagination):
+    cursor_ordering = ('-pub_date', 'id')
+    keyset_paginators = {'popular': PopularResultsPagination}
+    # Курсор сортирует по дате и сбил бы порядок по релевантности.
+    page_number_only_params = ('search',)
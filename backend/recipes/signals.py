@@ -0,0 +1,216 @@
+import logging
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (post_delete, post_save, pre_migrate,
+                                      pre_save)
+from django.dispatch import receiver
+
+from recipes.images import strip_metadata, update_renditions
+from recipes.models import (FAVORITE_WEIGHT, SHOPPING_CART_WEIGHT, Ingredient,
+                            PopularityEvent, Recipe, RecipeFavorite,
+                            RecipeIngredient, ShoppingCart, ShoppingListItem,
+                            User)
+
+logger = logging.getLogger(__name__)
+
+
+def increment(model, pk, field):
+    model.objects.filter(pk=pk).update(**{field: F(field) + 1})
+
+
+def decrement(model, pk, field):
+    model.objects.filter(pk=pk).update(**{field: Greatest(F(field) - 1, 0)})
+
+
+@receiver(post_save, sender=RecipeFavorite)
+def increment_favorites_count(instance, created, **kwargs):
+    if created:
+        increment(Recipe, instance.favorite_recipe_id, 'favorites_count')
+
+
+@receiver(post_delete, sender=RecipeFavorite)
+def decrement_favorites_count(instance, **kwargs):
+    decrement(Recipe, instance.favorite_recipe_id, 'favorites_count')
+
+
+@receiver(post_save, sender=ShoppingCart)
+def increment_shopping_cart_count(instance, created, **kwargs):
+    if created:
+        increment(Recipe, instance.recipe_buy_id, 'shopping_cart_count')
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_shopping_cart_count(instance, **kwargs):
+    decrement(Recipe, instance.recipe_buy_id, 'shopping_cart_count')
+
+
+def log_popularity_event(recipe_id, weight, created):
+    PopularityEvent.objects.create(
+        recipe_id=recipe_id, weight=weight, created=created
+    )
+
+
+@receiver(post_save, sender=RecipeFavorite)
+def log_favorite_added(instance, created, **kwargs):
+    if created:
+        log_popularity_event(
+            instance.favorite_recipe_id, FAVORITE_WEIGHT, instance.created
+        )
+
+
+@receiver(post_delete, sender=RecipeFavorite)
+def log_favorite_removed(instance, **kwargs):
+    log_popularity_event(
+        instance.favorite_recipe_id, -FAVORITE_WEIGHT, instance.created
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def log_shopping_cart_added(instance, created, **kwargs):
+    if created:
+        log_popularity_event(
+            instance.recipe_buy_id, SHOPPING_CART_WEIGHT, instance.created
+        )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def log_shopping_cart_removed(instance, **kwargs):
+    log_popularity_event(
+        instance.recipe_buy_id, -SHOPPING_CART_WEIGHT, instance.created
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    if created:
+        increment(User, instance.author_id, 'recipes_count')
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    decrement(User, instance.author_id, 'recipes_count')
+
+
+@receiver(pre_save, sender=Recipe)
+def strip_image_metadata(instance, **kwargs):
+    # Новая картинка еще не записана в хранилище: в него попадет копия
+    # без EXIF.
+    image = instance.image
+    if not image or image._committed:
+        return
+    try:
+        stripped = strip_metadata(image)
+    except (OSError, ValueError) as error:
+        logger.warning(
+            'Не удалось убрать метаданные картинки рецепта %s: %s',
+            instance.pk, error,
+        )
+        return
+    if stripped is not None:
+        instance.image = stripped
+
+
+def build_image_renditions(recipe):
+    try:
+        update_renditions(recipe)
+    except (OSError, ValueError) as error:
+        logger.warning(
+            'Не удалось создать копии картинки рецепта %s: %s',
+            recipe.pk, error,
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def update_image_renditions(instance, **kwargs):
+    # Копии строятся после коммита, когда строки рецепта уже не
+    # заблокированы; без INLINE их создает generate_image_renditions.
+    if settings.RECIPE_IMAGE_RENDITIONS['INLINE']:
+        transaction.on_commit(lambda: build_image_renditions(instance))
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_vector(instance, **kwargs):
+    # Ингредиенты сохраняются после рецепта, поэтому вектор
+    # пересчитывается после фиксации транзакции.
+    transaction.on_commit(
+        lambda: Recipe.objects.filter(pk=instance.pk).update_search_vector()
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search_vector(instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(
+            ingredients=instance
+        ).update_search_vector()
+
+
+# Списки покупок меняются в той же БД, куда записана строка: чтения
+# внутри записи не должны уходить на реплику.
+def recipe_amounts(recipe_id, sign, using):
+    return {
+        ingredient_id: (sign * amount, sign)
+        for ingredient_id, amount in RecipeIngredient.objects.using(
+            using
+        ).filter(recipe_id=recipe_id).values_list('ingredient_id', 'amount')
+    }
+
+
+def cart_users(recipe_id, using):
+    return ShoppingCart.objects.using(using).filter(
+        recipe_buy_id=recipe_id
+    ).values('user')
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(instance, created, using, **kwargs):
+    if created:
+        ShoppingListItem.objects.db_manager(using).add_amounts(
+            [instance.user_id],
+            recipe_amounts(instance.recipe_buy_id, 1, using),
+        )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_shopping_list(instance, using, **kwargs):
+    ShoppingListItem.objects.db_manager(using).add_amounts(
+        [instance.user_id], recipe_amounts(instance.recipe_buy_id, -1, using)
+    )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def update_shopping_lists(instance, created, using, **kwargs):
+    users = cart_users(instance.recipe_id, using)
+    items = ShoppingListItem.objects.db_manager(using)
+    if created:
+        items.add_amounts(
+            users, {instance.ingredient_id: (instance.amount, 1)}
+        )
+    else:
+        # Прежнее количество неизвестно: списки пересобираются целиком.
+        items.rebuild(users)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def subtract_from_shopping_lists(instance, using, **kwargs):
+    # При удалении рецепта строки корзины и ингредиентов удаляются в
+    # любом порядке; каждый рецепт вычитается ровно один раз, пока живы
+    # и строка корзины, и ингредиент.
+    ShoppingListItem.objects.db_manager(using).add_amounts(
+        cart_users(instance.recipe_id, using),
+        {instance.ingredient_id: (-instance.amount, -1)},
+    )
+
+
+@receiver(pre_migrate)
+def merge_duplicate_relations(sender, using, verbosity, **kwargs):
+    # Уникальные ограничения на (рецепт, ингредиент) и (рецепт, тег) не
+    # создадутся, пока в таблицах есть дубли.
+    if sender.name == 'recipes':
+        call_command(
+            'dedupe_recipe_relations', database=using, verbosity=verbosity
+        )
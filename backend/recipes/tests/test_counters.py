@@ -0,0 +1,48 @@
+"""Сохранение модели не затирает счетчики, измененные после загрузки."""
+import pytest
+
+from api.serializers import RecipePostPatchDelSerializer
+from recipes.models import Recipe, RecipeFavorite, ShoppingCart
+from users.models import Subscription, User
+
+
+@pytest.fixture
+def recipe(make_recipes):
+    return make_recipes(1)[0]
+
+
+def test_recipe_save_keeps_counters(recipe, user):
+    stale = Recipe.objects.get(pk=recipe.pk)
+    RecipeFavorite.objects.create(user=user, favorite_recipe=recipe)
+    ShoppingCart.objects.create(user=user, recipe_buy=recipe)
+    stale.name = 'Новое'
+    stale.save()
+    recipe.refresh_from_db()
+    assert recipe.name == 'Новое'
+    assert (recipe.favorites_count, recipe.shopping_cart_count) == (1, 1)
+
+
+def test_recipe_update_keeps_counters(recipe, user, tags, ingredients):
+    stale = Recipe.objects.get(pk=recipe.pk)
+    RecipeFavorite.objects.create(user=user, favorite_recipe=recipe)
+    serializer = RecipePostPatchDelSerializer(stale, partial=True, data={
+        'name': 'Новое',
+        'tags': [tags[0].pk],
+        'ingredients': [{'id': ingredients[0].pk, 'amount': 50}],
+    })
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    recipe.refresh_from_db()
+    assert recipe.name == 'Новое'
+    assert recipe.favorites_count == 1
+
+
+def test_user_save_keeps_counters(author, user, make_recipes):
+    stale = User.objects.get(pk=author.pk)
+    make_recipes(1)
+    Subscription.objects.create(user=user, author=author)
+    stale.first_name = 'Новое'
+    stale.save()
+    author.refresh_from_db()
+    assert author.first_name == 'Новое'
+    assert (author.recipes_count, author.followers_count) == (1, 1)
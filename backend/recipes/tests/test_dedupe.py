@@ -0,0 +1,44 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+from recipes.models import RecipeIngredient, RecipeTag
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def without_unique_constraints(monkeypatch):
+    # Таблицы, какими они были до уникальных ограничений. SQLite
+    # пересоздает таблицу по Meta модели, поэтому Meta подменяется.
+    models = (RecipeIngredient, RecipeTag)
+    constraints = [model._meta.constraints[0] for model in models]
+    for model in models:
+        monkeypatch.setattr(model._meta, 'constraints', [])
+    with connection.schema_editor() as editor:
+        for model, constraint in zip(models, constraints):
+            editor.remove_constraint(model, constraint)
+    yield
+    monkeypatch.undo()
+    with connection.schema_editor() as editor:
+        for model, constraint in zip(models, constraints):
+            editor.add_constraint(model, constraint)
+
+
+def test_merges_duplicates(without_unique_constraints, make_recipes,
+                           ingredients, tags):
+    recipe, = make_recipes(1)
+    first = recipe.recipeingredient.get(ingredient=ingredients[0])
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe=recipe, ingredient=ingredients[0], amount=5),
+        RecipeIngredient(recipe=recipe, ingredient=ingredients[0], amount=7),
+    ])
+    RecipeTag.objects.bulk_create([RecipeTag(recipe=recipe, tag=tags[0])])
+
+    call_command('dedupe_recipe_relations')
+
+    assert list(recipe.recipeingredient.filter(
+        ingredient=ingredients[0]
+    ).values_list('pk', 'amount')) == [(first.pk, 112)]
+    assert recipe.recipeingredient.count() == 3
+    assert RecipeTag.objects.filter(recipe=recipe, tag=tags[0]).count() == 1
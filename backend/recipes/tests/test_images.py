@@ -0,0 +1,73 @@
+import io
+
+import pytest
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.test import override_settings
+from PIL import Image
+
+from recipes.images import build_renditions, strip_metadata
+from recipes.models import Recipe
+
+
+def image_file(size):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name='source.png')
+
+
+@override_settings(RECIPE_IMAGE_RENDITIONS={
+    'WIDTHS': [320, 640, 1200], 'FORMATS': ['webp', 'jpeg'],
+})
+@pytest.mark.parametrize('size, widths', [
+    ((640, 480), [320, 640]),
+    ((800, 600), [320, 640, 800]),
+    ((200, 100), [200]),
+    ((2000, 1000), [320, 640, 1200]),
+])
+def test_renditions_without_duplicates(size, widths):
+    renditions = build_renditions(image_file(size))
+    assert set(renditions) == {'webp', 'jpeg'}
+    for entries in renditions.values():
+        assert [entry['width'] for entry in entries] == widths
+
+
+def jpeg_with_exif(size, orientation):
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    exif[0x010F] = 'Camera'
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif.tobytes())
+    return ContentFile(buffer.getvalue(), name='source.jpg')
+
+
+@pytest.mark.parametrize('orientation, size', [
+    (1, (40, 20)),
+    (6, (20, 40)),
+])
+def test_strip_metadata(orientation, size):
+    stripped = strip_metadata(jpeg_with_exif((40, 20), orientation))
+    with Image.open(stripped) as image:
+        assert image.format == 'JPEG'
+        assert image.size == size
+        assert 'exif' not in image.info
+        assert not image.getexif()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('inline', [True, False])
+def test_recipe_image(inline, author, settings):
+    settings.RECIPE_IMAGE_RENDITIONS = {
+        'WIDTHS': [320], 'FORMATS': ['jpeg'], 'INLINE': inline,
+    }
+    with transaction.atomic():
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Текст', cooking_time=10,
+            image=jpeg_with_exif((40, 20), 1),
+        )
+        # Копии строятся только после коммита.
+        assert recipe.image_renditions == {}
+    with Image.open(recipe.image.path) as image:
+        assert not image.getexif()
+    recipe.refresh_from_db()
+    assert bool(recipe.image_renditions) is inline
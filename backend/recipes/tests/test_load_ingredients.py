@@ -0,0 +1,62 @@
+import io
+import json
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from recipes.management.commands.load_ingredients import iter_json_array
+from recipes.models import Ingredient
+
+
+def test_csv_skips_incomplete_rows(db, tmp_path, capsys):
+    path = tmp_path / 'ingredients.csv'
+    path.write_text(
+        'соль,г\n'
+        '\n'
+        'перец\n'
+        ',г\n'
+        ' сахар , кг \n'
+        'соль,г\n',
+        encoding='utf-8',
+    )
+    call_command('load_ingredients', path=str(path), batch_size=2)
+    assert set(Ingredient.objects.values_list('name', 'measurement_unit')) == {
+        ('соль', 'г'), ('сахар', 'кг'),
+    }
+    assert 'неполных строк: 3' in capsys.readouterr().out
+
+
+def test_json_skips_incomplete_items(db, tmp_path):
+    path = tmp_path / 'ingredients.json'
+    path.write_text(json.dumps([
+        {'name': 'соль', 'measurement_unit': 'г'},
+        {'name': 'перец'},
+        ['мука', 'г'],
+        ['вода'],
+        [],
+        'масло',
+    ]), encoding='utf-8')
+    call_command('load_ingredients', path=str(path))
+    assert set(Ingredient.objects.values_list('name', flat=True)) == {
+        'соль', 'мука',
+    }
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 64 * 1024])
+def test_json_read_in_chunks(chunk_size):
+    items = [{'name': 'соль', 'measurement_unit': 'г'}, ['мука', 'г'], 125]
+    file = io.StringIO(json.dumps(items, ensure_ascii=False, indent=2))
+    assert list(iter_json_array(file, chunk_size)) == items
+
+
+@pytest.mark.parametrize('content', [
+    '[{"name": "соль", "measurement_unit": "г"},',
+    '[["соль", "г"] ["мука", "г"]]',
+    '{"name": "соль"}',
+    '',
+])
+def test_malformed_json(content, db, tmp_path):
+    path = tmp_path / 'ingredients.json'
+    path.write_text(content, encoding='utf-8')
+    with pytest.raises(CommandError, match='Некорректный файл'):
+        call_command('load_ingredients', path=str(path))
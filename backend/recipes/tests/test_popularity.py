@@ -0,0 +1,103 @@
+import io
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from recipes.models import (FAVORITE_WEIGHT, PopularityEvent, RecipeFavorite,
+                            RecipePopularity, ShoppingCart)
+
+
+def scores():
+    return dict(RecipePopularity.objects.values_list('recipe_id', 'score'))
+
+
+def update_popularity(**options):
+    call_command('update_popularity', stdout=io.StringIO(), **options)
+
+
+def test_popular_keyset_pages(client, make_recipes):
+    recipes = make_recipes(8)
+    # Одинаковый рейтинг у нескольких рецептов: порядок решает id.
+    ranking = dict(zip(recipes, [5, 3, 3, 3, 2, 1, 1, 0.5]))
+    for recipe, score in ranking.items():
+        RecipePopularity.objects.create(recipe=recipe, score=score)
+    expected = [
+        recipe.pk for recipe in sorted(
+            recipes, key=lambda recipe: (-ranking[recipe], -recipe.pk)
+        )
+    ]
+
+    pages = []
+    url = '/api/recipes/popular/?limit=3'
+    while url:
+        data = client.get(url).json()
+        assert 'count' not in data
+        pages.append([recipe['id'] for recipe in data['results']])
+        url = data['next']
+    assert sum(pages, []) == expected
+    assert len(pages) == 3
+
+    backwards = []
+    url = data['previous']
+    while url:
+        data = client.get(url).json()
+        backwards.insert(0, [recipe['id'] for recipe in data['results']])
+        url = data['previous']
+    assert backwards == pages[:-1]
+
+
+def test_popular_invalid_cursor(client, db):
+    response = client.get('/api/recipes/popular/?cursor=broken')
+    assert response.status_code == 404
+
+
+def test_incremental_update(user, author, make_recipes):
+    first, second = make_recipes(2)
+    RecipeFavorite.objects.create(user=user, favorite_recipe=first)
+    update_popularity()
+    assert set(scores()) == {first.pk}
+    assert not PopularityEvent.objects.exists()
+
+    # Событие закоммичено после запуска, но создано раньше него.
+    RecipeFavorite.objects.create(
+        user=author, favorite_recipe=second,
+        created=timezone.now() - timedelta(hours=1),
+    )
+    ShoppingCart.objects.create(user=user, recipe_buy=first)
+    RecipeFavorite.objects.filter(user=user).delete()
+    update_popularity()
+    result = scores()
+    assert result[second.pk] == pytest.approx(FAVORITE_WEIGHT, rel=0.02)
+    assert result[first.pk] == pytest.approx(2.0, rel=0.02)
+
+    # Рецепт с рейтингом около нуля выбывает из таблицы.
+    ShoppingCart.objects.all().delete()
+    update_popularity()
+    assert set(scores()) == {second.pk}
+
+
+def test_prunes_old_events_and_decayed_scores(make_recipes):
+    fresh, stale, old = make_recipes(3)
+    RecipePopularity.objects.bulk_create([
+        RecipePopularity(recipe=fresh, score=1.0),
+        RecipePopularity(recipe=stale, score=0.0001),
+    ])
+    PopularityEvent.objects.create(
+        recipe_id=old.pk, weight=FAVORITE_WEIGHT,
+        created=timezone.now() - timedelta(days=365),
+    )
+    update_popularity()
+    assert set(scores()) == {fresh.pk}
+    assert not PopularityEvent.objects.exists()
+
+
+def test_full_update(user, make_recipes):
+    recipe, = make_recipes(1)
+    RecipeFavorite.objects.create(user=user, favorite_recipe=recipe)
+    update_popularity(full=True)
+    assert not PopularityEvent.objects.exists()
+    assert scores()[recipe.pk] == pytest.approx(FAVORITE_WEIGHT)
+    update_popularity()
+    assert scores()[recipe.pk] == pytest.approx(FAVORITE_WEIGHT)
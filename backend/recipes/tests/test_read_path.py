@@ -0,0 +1,75 @@
+"""Число запросов на чтение рецептов не зависит от размера страницы."""
+import pytest
+from django.test import override_settings
+
+from recipes.models import RecipeFavorite
+
+# Ответы анонимам кэшируются, здесь считаются запросы самого чтения.
+pytestmark = pytest.mark.usefixtures('no_response_cache')
+
+PAGE_SIZES = [1, 6, 20]
+
+
+@pytest.fixture
+def no_response_cache():
+    with override_settings(RESPONSE_CACHE={
+        'ENABLED': False, 'ALIAS': 'default', 'TIMEOUT': 0,
+    }):
+        yield
+
+
+@pytest.fixture
+def recipes(make_recipes):
+    return make_recipes(20)
+
+
+@pytest.mark.parametrize('limit', PAGE_SIZES)
+def test_list_anonymous(limit, client, recipes, django_assert_num_queries):
+    # count, страница, теги, ингредиенты.
+    with django_assert_num_queries(4):
+        response = client.get(f'/api/recipes/?limit={limit}')
+    assert len(response.json()['results']) == limit
+
+
+@pytest.mark.parametrize('limit', PAGE_SIZES)
+def test_list_authenticated(limit, shared_cache, user_client, recipes,
+                            django_assert_num_queries):
+    # Токен и множества избранного, корзины и подписок читаются из БД
+    # только при первом запросе, дальше — из кэша.
+    with django_assert_num_queries(8):
+        user_client.get(f'/api/recipes/?limit={limit}')
+    with django_assert_num_queries(4):
+        response = user_client.get(f'/api/recipes/?limit={limit}')
+    assert len(response.json()['results']) == limit
+
+
+def test_retrieve_anonymous(client, recipes, django_assert_num_queries):
+    # Рецепт с автором, теги, ингредиенты.
+    with django_assert_num_queries(3):
+        response = client.get(f'/api/recipes/{recipes[0].pk}/')
+    assert response.status_code == 200
+
+
+def test_retrieve_authenticated(shared_cache, user_client, recipes,
+                                django_assert_num_queries):
+    with django_assert_num_queries(7):
+        user_client.get(f'/api/recipes/{recipes[0].pk}/')
+    with django_assert_num_queries(3):
+        response = user_client.get(f'/api/recipes/{recipes[1].pk}/')
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('limit', PAGE_SIZES)
+def test_list_without_membership_cache(limit, user, user_client, recipes,
+                                       django_assert_num_queries):
+    # Флаги считаются подзапросами EXISTS в запросе страницы.
+    RecipeFavorite.objects.bulk_create(
+        RecipeFavorite(user=user, favorite_recipe=recipe) for recipe in recipes
+    )
+    user_client.get('/api/recipes/')
+    with override_settings(MEMBERSHIP_CACHE={'ENABLED': False, 'TIMEOUT': 0}):
+        with django_assert_num_queries(4):
+            response = user_client.get(f'/api/recipes/?limit={limit}')
+    assert all(
+        recipe['is_favorited'] is True for recipe in response.json()['results']
+    )
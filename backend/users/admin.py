@@ -10,6 +10,8 @@ class UserAdmin(admin.ModelAdmin):
         'first_name',
         'last_name',
         'email',
+        'recipes_count',
+        'followers_count',
     )
     ordering = (
         'email',
@@ -0,0 +1,21 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import Subscription, User
+
+
+@receiver(post_save, sender=Subscription)
+def increment_followers_count(instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            followers_count=F('followers_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_followers_count(instance, **kwargs):
+    User.objects.filter(pk=instance.author_id).update(
+        followers_count=Greatest(F('followers_count') - 1, 0)
+    )